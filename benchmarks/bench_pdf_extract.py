@@ -0,0 +1,108 @@
+# bench_pdf_extract.py
+"""
+Compares the PDF extraction engine in utils.parse_utils with the previous
+pdfplumber-first engine on generated PDFs.
+
+Usage: python -m benchmarks.bench_pdf_extract [--pages 20 200] [--table-every 10] [--json out.json]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import pdfplumber
+
+from utils.parse_utils import extract_text
+
+PARAGRAPH = (
+    "Quarterly revenue grew across all regions while operating costs stayed flat. "
+    "The board approved the new investment plan and asked for a follow-up review. "
+) * 6
+
+
+def generate_pdf(path: str, pages: int, table_every: int):
+    """Writes a PDF of text pages, with a ruled table on every table_every-th page."""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        if table_every and number % table_every == 0:
+            rows, cols = 12, 4
+            x0, y0, width, height = 50, 80, 480, 20
+            for r in range(rows + 1):
+                page.draw_line((x0, y0 + r * height), (x0 + width, y0 + r * height))
+            for c in range(cols + 1):
+                page.draw_line((x0 + c * width / cols, y0), (x0 + c * width / cols, y0 + rows * height))
+            for r in range(rows):
+                for c in range(cols):
+                    page.insert_text((x0 + 5 + c * width / cols, y0 + 14 + r * height), f"R{r}C{c} {r * c}")
+        else:
+            page.insert_textbox(fitz.Rect(50, 50, 545, 800), f"Page {number + 1}. " + PARAGRAPH * 2)
+    doc.save(path)
+    doc.close()
+
+
+def legacy_extract(path: str) -> str:
+    """The previous engine: pdfplumber over every page, built by string concatenation."""
+    text = ""
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return text.strip()
+
+
+def _time(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--table-every", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"generated_{pages}.pdf")
+            generate_pdf(path, pages, args.table_every)
+
+            legacy_s, legacy_text = _time(lambda: legacy_extract(path), args.repeat)
+            serial_s, serial_text = _time(lambda: extract_text(path, page_workers=1), args.repeat)
+            parallel_s, parallel_text = _time(lambda: extract_text(path), args.repeat)
+
+            row = {
+                "pages": pages,
+                "legacy_s": round(legacy_s, 4),
+                "fast_serial_s": round(serial_s, 4),
+                "fast_parallel_s": round(parallel_s, 4),
+                "speedup_serial": round(legacy_s / serial_s, 2),
+                "speedup_parallel": round(legacy_s / parallel_s, 2),
+                "legacy_chars": len(legacy_text),
+                "fast_chars": len(parallel_text),
+            }
+            results.append(row)
+            print(
+                f"{pages:>5} pages  legacy {legacy_s:8.3f}s  fast {serial_s:8.3f}s  "
+                f"fast+pool {parallel_s:8.3f}s  speedup x{row['speedup_serial']} / x{row['speedup_parallel']}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "pdf_extract", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
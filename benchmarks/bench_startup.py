@@ -0,0 +1,122 @@
+# bench_startup.py
+"""
+Measures worker cold start: how long a fresh interpreter takes to import main,
+to run the application's startup and to answer its first request, and which of
+the heavy libraries (parsers, report writers, Drive and LLM clients) were loaded
+by the import even though they are only needed on first use.
+
+Each sample runs in a new process from an empty working directory, without an
+OPENROUTER_API_KEY, like a freshly scaled-out worker.
+
+Exits non-zero when a heavy library is imported eagerly or the median import time
+exceeds --max-import-s, so it can guard startup time in CI.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--warm-up] [--max-import-s 1.5] [--json out.json]
+Compare two result files with: python -m benchmarks.compare base.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_suite import REPO_ROOT, _git_commit, percentile
+
+# Libraries that must only be imported when their format or backend is first used.
+LAZY_MODULES = [
+    "docx",
+    "fitz",
+    "fpdf",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "numpy",
+    "openai",
+    "openpyxl",
+    "pandas",
+    "pdfplumber",
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+eager = [m for m in {modules!r} if m in sys.modules]
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+with TestClient(main.app) as client:
+    started = time.perf_counter() - start
+    client.get("/rate-limits")
+    first_request = time.perf_counter() - start
+print(json.dumps({{"import_s": imported, "startup_s": started, "first_request_s": first_request, "eager": eager}}))
+"""
+
+
+def sample(warm_up: bool) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+    env["PYTHONPATH"] = REPO_ROOT
+    env["WARM_UP"] = "true" if warm_up else "false"
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        os.symlink(os.path.join(REPO_ROOT, "templates"), os.path.join(workdir, "templates"))
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(modules=LAZY_MODULES)],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    # The app prints during startup; the measurements are the last line.
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to measure")
+    parser.add_argument("--warm-up", action="store_true", help="start with WARM_UP=true")
+    parser.add_argument("--max-import-s", type=float, default=0.0, help="fail above this median import time (0 = no limit)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    samples = []
+    for run in range(args.runs):
+        print(f"Run {run + 1}/{args.runs}...", file=sys.stderr)
+        samples.append(sample(args.warm_up))
+
+    results = {}
+    for metric in ("import_s", "startup_s", "first_request_s"):
+        values = [s[metric] for s in samples]
+        results[metric.replace("_s", "_p50_s")] = round(percentile(values, 50), 4)
+        results[metric.replace("_s", "_max_s")] = round(max(values), 4)
+    eager = sorted({m for s in samples for m in s["eager"]})
+
+    output = {
+        "benchmark": "startup",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {"runs": args.runs, "warm_up": args.warm_up},
+        "eager_imports": eager,
+        "results": results,
+    }
+    print(json.dumps(output, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+    failures = []
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+    if args.max_import_s and results["import_p50_s"] > args.max_import_s:
+        failures.append(f"median import time {results['import_p50_s']}s exceeds {args.max_import_s}s")
+    if failures:
+        print("Startup check failed: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# bench_suite.py
+"""
+Offline end-to-end benchmark: runs every stage and the /parse-folder and
+/summarize-folder endpoints against a fake Drive and a local LLM stub, so
+throughput can be compared across commits without network access.
+
+Measured:
+  extract    extract_text per format (files/s, MB/s, p50/p95 per file)
+  download   fake Drive downloads at DOWNLOAD_CONCURRENCY (files/s, MB/s, p50/p95)
+  summarize  summarize_document against the stub at SUMMARIZE_CONCURRENCY
+  stream     streamed summarize_document: time to first token and to the full summary
+  endpoints  /parse-folder and /summarize-folder (files/s, p50/p95 per request)
+
+Usage: python -m benchmarks.bench_suite [--files 24] [--size-kb 32] [--llm-429-rate 0.05] [--json out.json]
+Compare two result files with: python -m benchmarks.compare base.json new.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import FakeDriveClient, StubLLMServer, generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_stats(latencies: List[float], wall_s: float, items: int, size_bytes: int = 0) -> Dict:
+    stats = {
+        "count": items,
+        "wall_s": round(wall_s, 6),
+        "items_per_s": round(items / wall_s, 2) if wall_s else 0.0,
+        "p50_s": round(percentile(latencies, 50), 6),
+        "p95_s": round(percentile(latencies, 95), 6),
+    }
+    if size_bytes:
+        stats["mb_per_s"] = round(size_bytes / (1024 * 1024) / wall_s, 2) if wall_s else 0.0
+    return stats
+
+
+def _timed_map(fn: Callable, items: List, workers: int):
+    """Runs fn over items on a thread pool and returns (per-item latencies, wall time)."""
+    latencies: List[float] = []
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(timed, items))
+    return latencies, time.perf_counter() - start
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_extract(corpus: List[Dict]) -> Dict:
+    from utils.parse_utils import extract_text
+
+    results = {}
+    for mime_type in sorted({f["mimeType"] for f in corpus}):
+        files = [f for f in corpus if f["mimeType"] == mime_type]
+        fmt = os.path.splitext(files[0]["name"])[1].lstrip(".")
+        latencies, wall = _timed_map(lambda f: extract_text(f["data"], f["mimeType"], f["name"]), files, 1)
+        results[fmt] = latency_stats(latencies, wall, len(files), sum(len(f["data"]) for f in files))
+    return results
+
+
+def bench_download(drive: FakeDriveClient, corpus: List[Dict]) -> Dict:
+    from utils.pipeline_utils import DOWNLOAD_CONCURRENCY
+
+    latencies, wall = _timed_map(lambda f: drive.download_to_buffer(f["id"]).close(), corpus, DOWNLOAD_CONCURRENCY)
+    return latency_stats(latencies, wall, len(corpus), sum(len(f["data"]) for f in corpus))
+
+
+def bench_summarize(corpus: List[Dict]) -> Dict:
+    from utils.parse_utils import extract_text
+    from utils.pipeline_utils import SUMMARIZE_CONCURRENCY
+    from utils.summarize_utils import summarize_document
+
+    texts = [(f["name"], extract_text(f["data"], f["mimeType"], f["name"])) for f in corpus]
+    failures = []
+
+    def summarize(item):
+        if "error" in summarize_document(*item):
+            failures.append(item[0])
+
+    latencies, wall = _timed_map(summarize, texts, SUMMARIZE_CONCURRENCY)
+    stats = latency_stats(latencies, wall, len(texts))
+    stats["failures"] = len(failures)
+    return stats
+
+
+def bench_stream(corpus: List[Dict]) -> Dict:
+    from utils.parse_utils import extract_text
+    from utils.pipeline_utils import SUMMARIZE_CONCURRENCY
+    from utils.summarize_utils import summarize_document
+
+    texts = [(f["name"], extract_text(f["data"], f["mimeType"], f["name"])) for f in corpus]
+    first_tokens: List[float] = []
+
+    def summarize(item):
+        start = time.perf_counter()
+        first = []
+
+        def on_token(token):
+            if not first:
+                first.append(time.perf_counter() - start)
+
+        summarize_document(*item, on_token=on_token)
+        first_tokens.extend(first)
+
+    latencies, wall = _timed_map(summarize, texts, SUMMARIZE_CONCURRENCY)
+    stats = latency_stats(latencies, wall, len(texts))
+    stats["first_token_p50_s"] = round(percentile(first_tokens, 50), 6)
+    stats["first_token_p95_s"] = round(percentile(first_tokens, 95), 6)
+    return stats
+
+
+def bench_endpoints(drive: FakeDriveClient, corpus: List[Dict], repeat: int, verbose: bool) -> Dict:
+    from fastapi.testclient import TestClient
+
+    import main
+
+    main.get_drive_client = lambda: drive
+    # The endpoints print their results; keep the benchmark output readable.
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    requests = {
+        "parse_folder": "/parse-folder/bench",
+        "summarize_folder": "/summarize-folder/bench?use_cache=false",
+    }
+    results = {}
+    with TestClient(main.app) as client, quiet:
+        for name, url in requests.items():
+            latencies = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}: {response.text[:200]}")
+            stats = latency_stats(latencies, sum(latencies), len(corpus) * repeat)
+            stats["requests"] = repeat
+            results[name] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=24, help="documents in the generated folder")
+    parser.add_argument("--size-kb", type=int, default=32, help="approximate text size of each document")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx", "txt", "csv"])
+    parser.add_argument("--drive-latency", type=float, default=0.05, help="seconds before each download starts")
+    parser.add_argument("--drive-bandwidth", type=float, default=50.0, help="simulated download speed in MB/s")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub completion")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="share of stub requests answered with 429")
+    parser.add_argument("--llm-retry-after", type=float, default=0.5, help="Retry-After sent with injected 429s")
+    parser.add_argument("--repeat", type=int, default=3, help="requests per endpoint")
+    parser.add_argument("--stages", nargs="+", default=["extract", "download", "summarize", "stream", "endpoints"])
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    stub = StubLLMServer(args.llm_latency, args.llm_429_rate, args.llm_retry_after)
+    os.environ["OPENROUTER_BASE_URL"] = stub.start()
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+    corpus = generate_corpus(args.files, args.size_kb, args.formats)
+    drive = FakeDriveClient(corpus, latency=args.drive_latency, bandwidth_mbps=args.drive_bandwidth)
+
+    # The app writes its outputs relative to the working directory; keep them out of the repo.
+    cwd = os.getcwd()
+    workdir = tempfile.TemporaryDirectory(prefix="bench-suite-")
+    os.chdir(workdir.name)
+    os.symlink(os.path.join(REPO_ROOT, "templates"), "templates")
+    sys.path.insert(0, REPO_ROOT)
+
+    results = {}
+    try:
+        stages = {
+            "extract": lambda: bench_extract(corpus),
+            "download": lambda: bench_download(drive, corpus),
+            "summarize": lambda: bench_summarize(corpus),
+            "stream": lambda: bench_stream(corpus),
+            "endpoints": lambda: bench_endpoints(drive, corpus, args.repeat, args.verbose),
+        }
+        for stage in args.stages:
+            print(f"Running {stage}...", file=sys.stderr)
+            results[stage] = stages[stage]()
+    finally:
+        stub.stop()
+        os.chdir(cwd)
+        workdir.cleanup()
+
+    output = {
+        "benchmark": "suite",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "verbose")},
+        "llm_stub": stub.counters,
+        "results": results,
+    }
+    print(json.dumps(output, indent=2))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
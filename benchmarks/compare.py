@@ -0,0 +1,82 @@
+# compare.py
+"""
+Compares two benchmark result files (from bench_suite or bench_pdf_extract --json)
+metric by metric and exits non-zero when any metric regressed by more than --threshold
+percent. Latencies (*_s) regress when they grow, throughputs (*_per_s) when they shrink.
+
+Usage: python -m benchmarks.compare base.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional
+
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    """Returns every numeric leaf of a result tree keyed by its dotted path."""
+    metrics: Dict[str, float] = {}
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        items = ()
+    for key, value in items:
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            metrics[path] = float(value)
+        else:
+            metrics.update(flatten(value, path))
+    return metrics
+
+
+def direction(metric: str) -> Optional[int]:
+    """+1 when higher is better, -1 when lower is better, None for counts and settings."""
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith("_per_s") or name.startswith("speedup"):
+        return 1
+    if name.endswith("_s"):
+        return -1
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if base.get("config") != new.get("config"):
+        print("Warning: the runs used different configurations.", file=sys.stderr)
+
+    base_metrics = flatten(base.get("results", {}))
+    new_metrics = flatten(new.get("results", {}))
+    print(f"base {base.get('commit', '?')[:12]}  new {new.get('commit', '?')[:12]}")
+    print(f"{'metric':<48} {'base':>12} {'new':>12} {'change':>9}")
+    regressions = []
+    for metric in sorted(base_metrics.keys() & new_metrics.keys()):
+        better = direction(metric)
+        if better is None:
+            continue
+        old, current = base_metrics[metric], new_metrics[metric]
+        change = (current - old) / old * 100 if old else 0.0
+        flag = ""
+        if better * change < -args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(metric)
+        print(f"{metric:<48} {old:>12.4f} {current:>12.4f} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
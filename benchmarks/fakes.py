@@ -0,0 +1,270 @@
+# fakes.py
+"""
+Offline stand-ins for the services the app talks to, used by the benchmark suite:
+generated document corpora, a fake DriveClient that serves them with simulated
+latency and bandwidth, and a local OpenAI-compatible chat completions server.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import docx
+import fitz  # PyMuPDF
+
+from utils.drive_utils import DOWNLOAD_SPOOL_THRESHOLD, DownloadBuffer
+
+FORMAT_MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+    "csv": "text/csv",
+}
+
+WORDS = (
+    "revenue quarter growth region customer contract budget forecast supplier board review "
+    "project delivery risk market product team policy report audit margin cost investment "
+    "schedule agreement compliance training service quality release strategy pipeline"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, size_bytes: int) -> List[str]:
+    paragraphs, total = [], 0
+    while total < size_bytes:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return paragraphs
+
+
+def generate_document(fmt: str, size_kb: int, seed: int) -> bytes:
+    """Returns a document of roughly size_kb kilobytes of text in the given format."""
+    rng = random.Random(seed)
+    size_bytes = size_kb * 1024
+    if fmt == "txt":
+        return "\n\n".join(_paragraphs(rng, size_bytes)).encode("utf-8")
+    if fmt == "csv":
+        lines = ["id,region,amount,date,note"]
+        total = 0
+        while total < size_bytes:
+            line = f"{len(lines)},{rng.choice(WORDS)},{rng.randint(1, 10000) / 10},2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},{rng.choice(WORDS)}"
+            lines.append(line)
+            total += len(line) + 1
+        return "\n".join(lines).encode("utf-8")
+    if fmt == "docx":
+        document = docx.Document()
+        for paragraph in _paragraphs(rng, size_bytes):
+            document.add_paragraph(paragraph)
+        out = io.BytesIO()
+        document.save(out)
+        return out.getvalue()
+    if fmt == "pdf":
+        pdf = fitz.open()
+        paragraphs = _paragraphs(rng, size_bytes)
+        # About 2,500 characters fit on a page at the default font size.
+        page_text, pages = [], []
+        for paragraph in paragraphs:
+            page_text.append(paragraph)
+            if sum(len(p) for p in page_text) > 2500:
+                pages.append("\n\n".join(page_text))
+                page_text = []
+        if page_text:
+            pages.append("\n\n".join(page_text))
+        for text in pages:
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontsize=9)
+        data = pdf.tobytes()
+        pdf.close()
+        return data
+    raise ValueError(f"Unknown corpus format: {fmt}")
+
+
+def generate_corpus(count: int, size_kb: int, formats: List[str], seed: int = 0) -> List[Dict]:
+    """Generates count Drive-style file records, cycling through formats, each carrying its bytes in "data"."""
+    corpus = []
+    for number in range(count):
+        fmt = formats[number % len(formats)]
+        data = generate_document(fmt, size_kb, seed + number)
+        corpus.append({
+            "id": f"bench-{number:05d}",
+            "name": f"document_{number:05d}.{fmt}",
+            "mimeType": FORMAT_MIME_TYPES[fmt],
+            "md5Checksum": hashlib.md5(data).hexdigest(),
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+            "size": str(len(data)),
+            "data": data,
+        })
+    return corpus
+
+
+class FakeDriveClient:
+    """
+    Serves a generated corpus through the DriveClient interface used by the app.
+    Each download waits latency seconds plus size / bandwidth, like a real transfer.
+    """
+
+    def __init__(self, corpus: List[Dict], latency: float = 0.05, bandwidth_mbps: float = 50.0, list_latency: float = 0.1):
+        self.corpus = corpus
+        self.by_id = {f["id"]: f for f in corpus}
+        self.latency = latency
+        self.bandwidth = bandwidth_mbps * 1024 * 1024
+        self.list_latency = list_latency
+
+    def authenticate(self):
+        pass
+
+    def list_files_in_folder(self, folder_id: str, max_depth: Optional[int] = None) -> List[Dict]:
+        time.sleep(self.list_latency)
+        return [{k: v for k, v in f.items() if k != "data"} for f in self.corpus]
+
+    def get_file(self, file_id: str) -> Dict:
+        time.sleep(self.list_latency)
+        return {k: v for k, v in self.by_id[file_id].items() if k != "data"}
+
+    def _transfer(self, file_id: str) -> bytes:
+        data = self.by_id[file_id]["data"]
+        time.sleep(self.latency + (len(data) / self.bandwidth if self.bandwidth > 0 else 0))
+        return data
+
+    def download_to_buffer(
+        self,
+        file_id: str,
+        chunk_size: Optional[int] = None,
+        spool_threshold: Optional[int] = None,
+        suffix: str = "",
+        export_mime_type: Optional[str] = None,
+    ) -> DownloadBuffer:
+        data = self._transfer(file_id)
+        buffer = DownloadBuffer(spool_threshold or DOWNLOAD_SPOOL_THRESHOLD, suffix)
+        buffer.write(data)
+        buffer.finish()
+        return buffer
+
+    def download_file(self, file_id: str, dest_path: str, chunk_size: Optional[int] = None, export_mime_type: Optional[str] = None) -> str:
+        with open(dest_path, "wb") as f:
+            f.write(self._transfer(file_id))
+        return dest_path
+
+
+class StubLLMServer:
+    """
+    Local OpenAI-compatible /chat/completions endpoint. Every request waits latency
+    seconds; a throttle_rate share of requests is answered with 429 and Retry-After.
+    Batched prompts are answered with a JSON object covering every document id.
+    Streamed requests (stream=true) get their first token after a fifth of the
+    latency and the remaining tokens spread over the rest.
+    """
+
+    def __init__(self, latency: float = 0.2, throttle_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "throttled": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, headers, payload = stub.respond(body)
+                if not isinstance(payload, dict):
+                    # Streamed reply: server-sent events until the connection closes.
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for event in payload:
+                        self.wfile.write(event.encode("utf-8"))
+                        self.wfile.flush()
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def respond(self, body: Dict):
+        with self._lock:
+            self.counters["requests"] += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.counters["throttled"] += 1
+        if throttled:
+            error = {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit", "code": 429}}
+            return 429, {"Retry-After": str(self.retry_after)}, error
+
+        if not body.get("stream"):
+            time.sleep(self.latency)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        ids = re.findall(r'<document id="([^"]+)">', prompt)
+        if ids:
+            content = json.dumps({doc_id: f"Stub summary of document {doc_id}." for doc_id in ids})
+        else:
+            content = f"Stub summary of {len(prompt)} characters of input."
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        with self._lock:
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["completion_tokens"] += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            return 200, {}, self._stream(body.get("model", "stub"), content, usage)
+        return 200, {}, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    def _stream(self, model: str, content: str, usage: Dict):
+        tokens = re.findall(r"\S+\s*", content)
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        time.sleep(self.latency * 0.2)
+        for number, token in enumerate(tokens):
+            if number:
+                time.sleep(self.latency * 0.8 / len(tokens))
+            chunk = {**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
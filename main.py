@@ -1,11 +1,20 @@
 import os
 import json
-from typing import List, Dict
-
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+import asyncio
+import hashlib
+import time
+import uuid
+import weakref
+from contextlib import AsyncExitStack, asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlencode
+from typing import Annotated, List, Dict, Optional, Tuple
+
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, Field
 
 # Import dotenv to load environment variables
 from dotenv import load_dotenv
@@ -18,47 +27,146 @@ load_dotenv()
 # It's called here to guarantee they exist before StaticFiles tries to mount them.
 def _ensure_dirs():
     os.makedirs("downloads", exist_ok=True)
-    os.makedirs("parsed_outputs", exist_ok=True)
+    os.makedirs("parsed_outputs", exist_ok=True) # Compressed, searchable store of extracted text
     os.makedirs("summaries", exist_ok=True)
     os.makedirs("reports", exist_ok=True) # Ensure reports directory exists
+    os.makedirs("cache", exist_ok=True) # Persistent summary cache
+    os.makedirs("manifests", exist_ok=True) # Per-folder manifests for incremental runs
+    os.makedirs("index", exist_ok=True) # Summary index behind the summaries view
 
 _ensure_dirs() # Call the function immediately after loading environment variables
 
 
 # Assuming drive_utils, parse_utils, and summarize_utils are in the same directory
-from utils.drive_utils import DriveClient
-from utils.parse_utils import extract_text
-from utils.summarize_utils import summarize_document 
-
-import pandas as pd
-from fpdf import FPDF
-
-app = FastAPI(title="Drive Document Summarizer")
+from utils.drive_utils import DriveClient, DriveClientManager
+from utils.index_utils import decode_cursor, encode_cursor, get_summary_index
+from utils.cache_utils import get_summary_cache
+from utils.manifest_utils import FolderManifest
+from utils.job_utils import Job, JobManager, QueueFullError
+from utils.metrics_utils import (
+    HTTP_REQUEST_SECONDS,
+    get_trace_id,
+    metrics_payload,
+    new_trace_id,
+    reset_trace_id,
+    set_trace_id,
+    timed,
+)
+from utils.parse_utils import warm_up as warm_up_parsers
+from utils.pipeline_utils import FolderPipeline, shutdown_parse_pool
+from utils.rate_utils import rate_stats
+from utils.report_utils import (
+    FOLDER_SCOPE,
+    RUN_SCOPE,
+    RunReports,
+    ensure_pdf,
+    latest_run_report,
+    read_snapshot,
+    report_path,
+    valid_report_key,
+)
+from utils.store_utils import PARSED_STORE_PATH, get_parsed_store
+from utils.summarize_utils import get_client as get_llm_client
+
+# Parsers, report writers and the Drive and LLM clients are loaded on first use so workers
+# start quickly. WARM_UP=true loads them in the background right after startup instead.
+WARM_UP = os.getenv("WARM_UP", "false").lower() in ("1", "true", "yes")
+
+
+job_manager = JobManager()
+# One Drive manager per process: shared credentials, cached discovery document, pooled connections.
+drive_manager = DriveClientManager()
+
+
+def get_drive_client() -> DriveClient:
+    """Returns a Drive client backed by the process-wide manager."""
+    return drive_manager.client()
+
+
+# Incremental runs on the same folder take turns: each holds the folder's lock from loading
+# its manifest until saving it, so concurrent runs cannot drop each other's entries.
+_folder_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _folder_lock(folder_id: str) -> asyncio.Lock:
+    lock = _folder_locks.get(folder_id)
+    if lock is None:
+        lock = _folder_locks[folder_id] = asyncio.Lock()
+    return lock
+
+
+def _warm_up():
+    """Imports the parsers and report writers and sets up the Drive and LLM clients ahead of the first request."""
+    start = time.perf_counter()
+    warm_up_parsers()
+    import fpdf
+    for name, setup in (("Drive", drive_manager.start), ("LLM", get_llm_client)):
+        try:
+            setup()
+        except Exception as e:
+            print(f"{name} setup deferred to the first request: {e}")
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_manager.start()
+    # Index summaries written before the index existed, without delaying startup.
+    backfill = asyncio.create_task(asyncio.to_thread(lambda: get_summary_index().backfill("summaries")))
+    warm_up = asyncio.create_task(asyncio.to_thread(_warm_up)) if WARM_UP else None
+    yield
+    await backfill
+    if warm_up is not None:
+        await warm_up
+    await job_manager.stop()
+    shutdown_parse_pool()
+
+
+app = FastAPI(title="Drive Document Summarizer", lifespan=lifespan)
 # Now, when StaticFiles is instantiated, these directories are guaranteed to exist.
 app.mount("/summaries", StaticFiles(directory="summaries"), name="summaries")
 app.mount("/reports", StaticFiles(directory="reports"), name="reports") # Mount reports directory for access
 templates = Jinja2Templates(directory="templates")
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Gives every request a trace id (or keeps the caller's X-Trace-Id) and records its latency."""
+    trace_id = request.headers.get("x-trace-id") or new_trace_id()
+    token = set_trace_id(trace_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Label by route template, not raw path, so folder and job ids do not explode the series.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(status_code)).observe(time.perf_counter() - start)
+        reset_trace_id(token)
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+
 @app.get("/test-list/{folder_id}")
-async def test_list(folder_id: str):
+async def test_list(folder_id: str, max_depth: Optional[int] = Query(None, ge=0)):
     """
-    Lists files in a specified Google Drive folder.
+    Lists files in a specified Google Drive folder and its subfolders.
     """
-    drive = DriveClient()
-    drive.authenticate()
-    files = drive.list_files_in_folder(folder_id)
+    drive = get_drive_client()
+    await asyncio.to_thread(drive.authenticate)
+    files = await asyncio.to_thread(drive.list_files_in_folder, folder_id, max_depth)
     return {"files": files}
 
 
 @app.get("/download-folder/{folder_id}")
-async def download_folder(folder_id: str):
+async def download_folder(folder_id: str, max_depth: Optional[int] = Query(None, ge=0)):
     """
     Downloads all files from a specified Google Drive folder to the 'downloads' directory.
     """
-    drive = DriveClient()
-    drive.authenticate()
-    files = drive.list_files_in_folder(folder_id)
+    drive = get_drive_client()
+    await asyncio.to_thread(drive.authenticate)
+    files = await asyncio.to_thread(drive.list_files_in_folder, folder_id, max_depth)
 
     if not files:
         return JSONResponse(content={"message": "No files found in this folder."}, status_code=404)
@@ -70,147 +178,617 @@ async def download_folder(folder_id: str):
         file_id = f["id"]
         name = f["name"]
         dest_path = os.path.join("downloads", name)
-        drive.download_file(file_id, dest_path)
+        # Drive allows several files with the same name; keep them apart instead of overwriting.
+        if dest_path in downloaded_files:
+            stem, ext = os.path.splitext(name)
+            dest_path = os.path.join("downloads", f"{stem}_{file_id}{ext}")
+        await asyncio.to_thread(drive.download_file, file_id, dest_path, export_mime_type=f.get("exportMimeType"))
         downloaded_files.append(dest_path)
 
     return {"message": "Files downloaded successfully", "files": downloaded_files}
 
 
 @app.get("/parse-folder/{folder_id}")
-async def parse_folder(folder_id: str):
+async def parse_folder(
+    folder_id: str,
+    download_concurrency: Optional[int] = Query(None, ge=1),
+    parse_workers: Optional[int] = Query(None, ge=1),
+    incremental: bool = False,
+    max_depth: Optional[int] = Query(None, ge=0),
+):
     """
-    Downloads files from a folder, extracts text, and saves parsed content.
+    Downloads files from a folder, extracts text, and saves parsed content to the
+    parsed-output store, where it can be searched with /search.
+    With incremental=true only files added or changed since the last incremental
+    run are processed, and outputs of deleted files are removed.
     """
-    drive = DriveClient()
-    drive.authenticate()
-    files = drive.list_files_in_folder(folder_id)
-
-    if not files:
+    drive = get_drive_client()
+    await asyncio.to_thread(drive.authenticate)
+    timings: Dict[str, float] = {}
+    with timed("list", timings):
+        files = await asyncio.to_thread(drive.list_files_in_folder, folder_id, max_depth)
+
+    # An incremental run on an emptied folder still has outputs to clean up.
+    if not files and not incremental:
         return JSONResponse(content={"message": "No files found in this folder."}, status_code=404)
 
-    parsed_files = []
+    pipeline = FolderPipeline(
+        drive,
+        download_concurrency=download_concurrency,
+        parse_workers=parse_workers,
+        summarize=False,
+        folder_id=folder_id,
+        store=await asyncio.to_thread(get_parsed_store),
+    )
+    changes = None
+    if incremental:
+        async with _folder_lock(folder_id):
+            manifest = await asyncio.to_thread(FolderManifest.load, folder_id, "parse")
+            parsed_files, changes = await pipeline.run_incremental(files, manifest)
+    else:
+        parsed_files = await pipeline.run(files)
+
+    response = {
+        "parsed_files": parsed_files,
+        "saved_to": PARSED_STORE_PATH,
+        "trace_id": get_trace_id(),
+        "timings": {**timings, **pipeline.stage_seconds},
+    }
+    if changes is not None:
+        response["changes"] = changes
+    return response
 
-    for f in files:
-        file_id = f["id"]
-        name = f["name"]
-        mime = f.get("mimeType")
 
-        # Download locally
-        dest_path = os.path.join("downloads", name)
-        drive.download_file(file_id, dest_path)
+@app.get("/search")
+async def search_parsed(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=200),
+    folder_id: Optional[str] = None,
+):
+    """
+    Full-text search over parsed documents. Every word of the query must appear;
+    results are ranked by relevance and include a snippet around the first match.
+    """
+    store = await asyncio.to_thread(get_parsed_store)
+    results = await asyncio.to_thread(store.search, q, limit, folder_id)
+    return {"query": q, "count": len(results), "results": results}
+
+
+@app.get("/parsed/{file_id}")
+async def get_parsed(file_id: str):
+    """Returns the stored extracted text and metadata of one parsed file."""
+    store = await asyncio.to_thread(get_parsed_store)
+    document = await asyncio.to_thread(store.get, file_id)
+    if document is None:
+        return JSONResponse(content={"message": "No parsed text stored for this file."}, status_code=404)
+    return document
+
+
+class SummarizeOptions(BaseModel):
+    """Per-run options shared by /summarize-folder and summarize jobs."""
+    download_concurrency: Optional[int] = Field(None, ge=1)
+    parse_workers: Optional[int] = Field(None, ge=1)
+    summarize_concurrency: Optional[int] = Field(None, ge=1)
+    use_cache: bool = True
+    incremental: bool = False
+    batch_small_files: bool = True
+    dedup: bool = True
+    # Subfolder levels to include (DRIVE_CRAWL_MAX_DEPTH by default, 0 = direct children only).
+    max_depth: Optional[int] = Field(None, ge=0)
+
+
+async def _summarize_pipeline(
+    drive,
+    options: SummarizeOptions,
+    reports: RunReports,
+    job: Optional[Job] = None,
+    folder_id: Optional[str] = None,
+    stream: bool = False,
+) -> FolderPipeline:
+    """Builds a summarizing pipeline for a run: finished files go to the run's reports and job."""
+
+    def on_progress(f: Dict, stage: str, result: Optional[Dict]):
+        if job is not None:
+            job.on_progress(f, stage, result)
+        if stage in ("done", "cached", "failed"):
+            # Only queues the row; it is written on the report writer thread.
+            reports.record(f, stage, result)
+
+    return FolderPipeline(
+        drive,
+        download_concurrency=options.download_concurrency,
+        parse_workers=options.parse_workers,
+        summarize_concurrency=options.summarize_concurrency,
+        cache=await asyncio.to_thread(get_summary_cache) if options.use_cache else None,
+        batch_small_files=options.batch_small_files,
+        on_progress=on_progress,
+        index=await asyncio.to_thread(get_summary_index),
+        folder_id=folder_id,
+        job_id=job.id if job is not None else None,
+        store=await asyncio.to_thread(get_parsed_store),
+        on_token=(lambda f, text: job.publish("token", {"file_id": f["id"], "text": text})) if stream else None,
+        dedup=options.dedup,
+    )
+
+
+def _record_unchanged(reports: RunReports, files: List[Dict], results: List[Dict]):
+    """Files an incremental run left unchanged still belong in this run's report."""
+    for f, result in zip(files, results):
+        if f["id"] not in reports.recorded:
+            reports.record(f, "unchanged", result)
+
+
+def _record_removed(reports: RunReports, pipeline: FolderPipeline):
+    """Files an incremental run found deleted leave their folder's report."""
+    for f in pipeline.removed:
+        reports.record_removed(f)
+
+
+async def _run_summarize_folder(
+    folder_id: Optional[str],
+    options: SummarizeOptions,
+    job: Optional[Job] = None,
+    file_id: Optional[str] = None,
+    stream: bool = False,
+) -> Dict:
+    """
+    Lists, downloads, parses and summarizes a folder and writes the reports.
+    When run as a job, per-file progress is reported to the job and the reports
+    get job-specific names so concurrent jobs do not overwrite each other.
+    With file_id only that file is summarized. With stream (requires a job) the
+    summary text is published to the job as "token" events while it is generated.
+    """
+    drive = get_drive_client()
+    await asyncio.to_thread(drive.authenticate)
+    timings: Dict[str, float] = {}
+    with timed("list", timings):
+        if file_id is not None:
+            files = [await asyncio.to_thread(drive.get_file, file_id)]
+            folder_id = folder_id or (files[0].get("parents") or [None])[0]
+        else:
+            files = await asyncio.to_thread(drive.list_files_in_folder, folder_id, options.max_depth)
+
+    if not files and not options.incremental:
+        return {"summaries": [], "message": "No files found in this folder."}
+
+    if job is not None:
+        job.track_files(files)
+
+    # Reports grow as files finish; a job's run id is its job id.
+    reports = RunReports(job.id if job is not None else uuid.uuid4().hex, folder_id, timings)
+    pipeline = await _summarize_pipeline(drive, options, reports, job, folder_id, stream)
+    changes = None
+    if options.incremental and file_id is None:
+        async with _folder_lock(folder_id):
+            manifest = await asyncio.to_thread(FolderManifest.load, folder_id, "summarize")
+            summaries, changes = await pipeline.run_incremental(files, manifest)
+    else:
+        summaries = await pipeline.run(files)
+
+    _record_unchanged(reports, files, summaries)
+    _record_removed(reports, pipeline)
+    await asyncio.to_thread(reports.wait)
+    report_links = reports.links()
+    if job is not None:
+        job.reports = report_links["run"]
+
+    final_output = {
+        "summaries": summaries,
+        "saved_text_to": PARSED_STORE_PATH,
+        "saved_summaries_to": "summaries/",
+        "run_id": reports.run_id,
+        "csv_report_link": report_links["run"]["csv"], # Link to the CSV report
+        "pdf_report_link": report_links["run"]["pdf"], # Link to the PDF report (rendered on first download)
+        "report_links": report_links,
+        "cache": pipeline.cache_stats,
+        "duplicates": pipeline.dedup_stats,
+        "trace_id": get_trace_id(),
+        # Per-stage seconds summed over files; stages overlap, so they can exceed the wall time.
+        "timings": {**timings, **pipeline.stage_seconds},
+    }
+    if changes is not None:
+        final_output["changes"] = changes
+    return final_output
 
-        # Extract text
-        text = extract_text(dest_path, mime)
-        preview = text[:1000] + "..." if len(text) > 1000 else text
 
-        file_info = {
-            "file_name": name,
-            "mime_type": mime,
-            "chars": len(text),
-            "preview": preview
-        }
-        parsed_files.append(file_info)
+# Most folders one batch request may name, and how many of them are listed at the same time.
+BATCH_MAX_FOLDERS = int(os.getenv("BATCH_MAX_FOLDERS", "100"))
+BATCH_LIST_CONCURRENCY = int(os.getenv("BATCH_LIST_CONCURRENCY", "4"))
 
-        # Save parsed file JSON
-        save_path = os.path.join("parsed_outputs", f"{os.path.splitext(name)[0]}.json")
-        with open(save_path, "w", encoding="utf-8") as out:
-            json.dump({"full_text": text, **file_info}, out, ensure_ascii=False, indent=2)
 
-        # Also save raw text for easy reading
-        txt_path = os.path.join("parsed_outputs", f"{os.path.splitext(name)[0]}.txt")
-        with open(txt_path, "w", encoding="utf-8") as out:
-            out.write(text)
+class BatchSummarizeRequest(SummarizeOptions):
+    """Body of the multi-folder endpoints: the folders plus the usual run options."""
+    folder_ids: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_FOLDERS)
+    # Files taken from a folder per scheduling round (default 1 each, i.e. round-robin).
+    weights: Dict[str, Annotated[int, Field(ge=1, le=100)]] = {}
 
-    # Save combined summary of parsed files
-    combined_path = os.path.join("parsed_outputs", "parsed_summary.json")
-    with open(combined_path, "w", encoding="utf-8") as out:
-        json.dump({"parsed_files": parsed_files}, out, ensure_ascii=False, indent=2)
 
+async def _run_summarize_folders(request: BatchSummarizeRequest, job: Optional[Job] = None) -> Dict:
+    """
+    Summarizes several folders as one run: all their files share one pipeline and its
+    workers, scheduled across folders by weight, and the result holds both the combined
+    summaries and a section per folder. A folder that cannot be listed is reported in
+    its section without failing the others.
+    """
+    folder_ids = list(dict.fromkeys(request.folder_ids))
+    drive = get_drive_client()
+    await asyncio.to_thread(drive.authenticate)
+    timings: Dict[str, float] = {}
+
+    listing_slots = asyncio.Semaphore(BATCH_LIST_CONCURRENCY)
+
+    async def list_folder(folder_id: str):
+        async with listing_slots:
+            try:
+                return await asyncio.to_thread(drive.list_files_in_folder, folder_id, request.max_depth)
+            except Exception as e:
+                print(f"Listing error for folder {folder_id}: {e}")
+                return e
+
+    with timed("list", timings):
+        listings = dict(zip(folder_ids, await asyncio.gather(*(list_folder(folder_id) for folder_id in folder_ids))))
+    listed = [folder_id for folder_id in folder_ids if not isinstance(listings[folder_id], Exception)]
+
+    if job is not None:
+        job.track_files(list({f["id"]: f for folder_id in listed for f in listings[folder_id]}.values()))
+
+    reports = RunReports(job.id if job is not None else uuid.uuid4().hex, timings=timings)
+    pipeline = await _summarize_pipeline(drive, request, reports, job)
+    async with AsyncExitStack() as folder_locks:
+        groups = []
+        if request.incremental:
+            # Locks are taken in a fixed order so batches sharing folders cannot deadlock.
+            for folder_id in sorted(listed):
+                await folder_locks.enter_async_context(_folder_lock(folder_id))
+        for folder_id in listed:
+            manifest = None
+            if request.incremental:
+                manifest = await asyncio.to_thread(FolderManifest.load, folder_id, "summarize")
+            groups.append((folder_id, listings[folder_id], manifest))
+        outcomes = await pipeline.run_folders(groups, [request.weights.get(folder_id, 1) for folder_id in listed])
+
+    folders: Dict[str, Dict] = {}
+    summaries: List[Dict] = []
+    for folder_id, (results, changes) in zip(listed, outcomes):
+        files = [dict(f, folderId=folder_id) for f in listings[folder_id]]
+        _record_unchanged(reports, files, results)
+        folders[folder_id] = {
+            "files": len(files),
+            "failed": sum(1 for f in files if f["id"] in pipeline.failed),
+            "summaries": results,
+            "report_links": reports.links(folder_id)["folder"],
+        }
+        if changes is not None:
+            folders[folder_id]["changes"] = changes
+        summaries.extend({**result, "folder_id": folder_id} for result in results)
+    for folder_id in folder_ids:
+        if folder_id not in folders:
+            folders[folder_id] = {"files": 0, "failed": 0, "summaries": [], "error": str(listings[folder_id])}
+
+    _record_removed(reports, pipeline)
+    await asyncio.to_thread(reports.wait)
+    report_links = reports.links()
+    if job is not None:
+        job.reports = report_links["run"]
     return {
-        "parsed_files": parsed_files,
-        "saved_to": "parsed_outputs/"
+        "summaries": summaries,
+        "folders": folders,
+        "run_id": reports.run_id,
+        "csv_report_link": report_links["run"]["csv"],
+        "pdf_report_link": report_links["run"]["pdf"],
+        "cache": pipeline.cache_stats,
+        "duplicates": pipeline.dedup_stats,
+        "in_flight": rate_stats()["in_flight"],
+        "trace_id": get_trace_id(),
+        "timings": {**timings, **pipeline.stage_seconds},
     }
 
 
 @app.get("/summarize-folder/{folder_id}")
-async def summarize_folder(folder_id: str):
+async def summarize_folder(folder_id: str, options: SummarizeOptions = Depends()):
     """
     Downloads files, extracts text, summarizes them, and generates CSV/PDF reports.
+    Downloads, extraction and LLM calls run as concurrent stages; the optional
+    query parameters override each stage's concurrency for this run.
+    Unchanged files (same Drive checksum and summary settings) are served from the
+    summary cache unless use_cache is false.
+    With incremental=true only files added or changed since the last incremental
+    run are processed; the reports still cover the whole folder.
+    Small files are packed into shared LLM requests unless batch_small_files is false.
+    For large folders prefer POST /jobs/summarize-folder/{folder_id}.
     """
-    drive = DriveClient()
-    drive.authenticate()
-    files = drive.list_files_in_folder(folder_id)
+    final_output = await _run_summarize_folder(folder_id, options)
+    if "message" in final_output:
+        return JSONResponse(content={"message": final_output["message"]}, status_code=404)
 
-    if not files:
-        return JSONResponse(content={"message": "No files found in this folder."}, status_code=404)
+    print(
+        f"[trace {final_output['trace_id']}] summarize-folder {folder_id}: "
+        f"{len(final_output['summaries'])} files, cache {final_output['cache']}, timings {final_output['timings']}"
+    )
 
-    # _ensure_dirs() # Not needed here, as it's called once at module load
+    return final_output
 
-    summaries = []
 
-    for f in files:
-        file_id = f["id"]
-        name = f["name"]
-        mime = f.get("mimeType")
+# --- Background jobs ---
 
-        dest_path = os.path.join("downloads", name)
-        drive.download_file(file_id, dest_path)
-
-        text = extract_text(dest_path, mime)
-
-        # Save extracted text
-        txt_path = os.path.join("parsed_outputs", f"{os.path.splitext(name)[0]}.txt")
-        with open(txt_path, "w", encoding="utf-8") as out:
-            out.write(text)
-
-        # Summarize
-        summary_obj = summarize_document(name, text)
-
-        # Save summary txt
-        summary_path = os.path.join("summaries", f"{os.path.splitext(name)[0]}_summary.txt")
-        with open(summary_path, "w", encoding="utf-8") as out:
-            out.write(summary_obj["summary"])
-
-        summaries.append({
-            "file_name": name,
-            "summary": summary_obj["summary"]
-        })
-
-    # Generate CSV report
-    csv_path = os.path.join("reports", "summaries_report.csv")
-    df = pd.DataFrame(summaries)
-    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-
-    # Generate PDF report
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Document Summaries", ln=True, align="C")
-    pdf.ln(10)
-
-    pdf.set_font("Arial", "", 12)
-    for s in summaries:
-        pdf.multi_cell(0, 6, f"File: {s['file_name']}")
-        pdf.multi_cell(0, 6, f"Summary: {s['summary']}")
-        pdf.ln(5)
-
-    pdf_path = os.path.join("reports", "summaries_report.pdf")
-    pdf.output(pdf_path)
+@app.post("/jobs/summarize-folder/{folder_id}", status_code=202)
+async def submit_summarize_job(folder_id: str, options: SummarizeOptions = Depends()):
+    """
+    Queues a folder summarization job and returns its id immediately.
+    Responds 429 when the job queue is full.
+    """
+    try:
+        job = job_manager.submit(
+            "summarize-folder",
+            {"folder_id": folder_id, **options.model_dump()},
+            lambda job: _run_summarize_folder(folder_id, options, job),
+        )
+    except QueueFullError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=429, headers={"Retry-After": "30"})
 
-    final_output = {
-        "summaries": summaries,
-        "saved_text_to": "parsed_outputs/",
-        "saved_summaries_to": "summaries/",
-        "csv_report_link": f"/reports/{os.path.basename(csv_path)}", # Link to the CSV report
-        "pdf_report_link": f"/reports/{os.path.basename(pdf_path)}"  # Link to the PDF report
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
     }
 
-    print(json.dumps(final_output, ensure_ascii=False, indent=2))
 
+@app.post("/summarize-folders")
+async def summarize_folders(request: BatchSummarizeRequest):
+    """
+    Summarizes many folders in one request. Files from every folder are scheduled
+    round-robin (or by "weights") on one shared set of workers, so a large folder
+    cannot starve the small ones, and downloads and LLM requests stay within the
+    process-wide in-flight caps. Returns the combined summaries plus per-folder results.
+    For many or large folders prefer POST /jobs/summarize-folders.
+    """
+    final_output = await _run_summarize_folders(request)
+    print(
+        f"[trace {final_output['trace_id']}] summarize-folders {len(final_output['folders'])} folders: "
+        f"{len(final_output['summaries'])} files, cache {final_output['cache']}, timings {final_output['timings']}"
+    )
     return final_output
 
 
+@app.post("/jobs/summarize-folders", status_code=202)
+async def submit_summarize_folders_job(request: BatchSummarizeRequest):
+    """Queues a multi-folder summarization job (see POST /summarize-folders) and returns its id immediately."""
+    try:
+        job = job_manager.submit(
+            "summarize-folders",
+            request.model_dump(),
+            lambda job: _run_summarize_folders(request, job),
+        )
+    except QueueFullError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=429, headers={"Retry-After": "30"})
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Returns a job's status, per-file stage and progress, and its results and report links once finished.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(content={"message": "Job not found."}, status_code=404)
+    return job.to_dict()
+
+
+def _job_event_response(job: Job, request: Request, on_close=None, last_event_id: int = 0) -> StreamingResponse:
+    """
+    Streams a job's events after last_event_id as Server-Sent Events until its "end" event;
+    on_close runs when the stream ends.
+    """
+
+    async def event_stream():
+        queue = job.subscribe(last_event_id)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield (
+                    f"id: {message['id']}\nevent: {message['event']}\n"
+                    f"data: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+                )
+                if message["event"] == "end":
+                    return
+        finally:
+            job.unsubscribe(queue)
+            if on_close is not None:
+                on_close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job: stage changes, each summary as soon as it is ready,
+    and a final "end" event with the job status and report links.
+    Every event has an id; a client reconnecting with Last-Event-ID resumes after it.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(content={"message": "Job not found."}, status_code=404)
+    try:
+        last_event_id = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_event_id = 0
+    return _job_event_response(job, request, last_event_id=last_event_id)
+
+
+# --- Streaming summaries ---
+
+def _stream_summaries(request: Request, kind: str, params: Dict, run) -> Response:
+    """
+    Queues a summarization as a job and streams it as Server-Sent Events: the same
+    events as a job, plus "token" events carrying each file's summary text as it is
+    generated. Streams share the job workers and queue limit (429 when full), and the
+    job is cancelled if the client disconnects before it ends.
+    """
+
+    async def runner(job: Job) -> Dict:
+        result = await run(job)
+        if "message" in result:
+            # Nothing to summarize: end the stream as failed, with the message as its error.
+            job.result = result
+            raise RuntimeError(result["message"])
+        return result
+
+    try:
+        job = job_manager.submit(kind, params, runner)
+    except QueueFullError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=429, headers={"Retry-After": "30"})
+    return _job_event_response(job, request, on_close=lambda: job_manager.cancel(job.id))
+
+
+@app.get("/summarize-folder/{folder_id}/stream")
+async def summarize_folder_stream(folder_id: str, request: Request, options: SummarizeOptions = Depends()):
+    """
+    Summarizes a folder like /summarize-folder, but as a Server-Sent Events stream:
+    "token" events ({"file_id", "text"}) deliver each summary while the LLM writes it,
+    interleaved across files; "result" events carry each finished summary and the
+    "end" event the full result with report links. Summaries are saved and reported
+    as usual. Small-file batching is not used while streaming.
+    """
+    return _stream_summaries(
+        request,
+        "summarize-folder-stream",
+        {"folder_id": folder_id, **options.model_dump()},
+        lambda job: _run_summarize_folder(folder_id, options, job, stream=True),
+    )
+
+
+@app.get("/summarize-file/{file_id}/stream")
+async def summarize_file_stream(file_id: str, request: Request, use_cache: bool = True):
+    """
+    Summarizes a single Drive file as a Server-Sent Events stream of "token" events,
+    followed by an "end" event with the saved summary and report links.
+    """
+    options = SummarizeOptions(use_cache=use_cache)
+    return _stream_summaries(
+        request,
+        "summarize-file-stream",
+        {"file_id": file_id, "use_cache": use_cache},
+        lambda job: _run_summarize_folder(None, options, job, file_id=file_id, stream=True),
+    )
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued or running job. Files already summarized keep their outputs.
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return JSONResponse(content={"message": "Job not found."}, status_code=404)
+    return {"job_id": job.id, "status": job.status}
+
+
+def _byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single "bytes=" range into (start, end) with end exclusive. Returns None when
+    the whole body should be sent (no range, several ranges or a malformed header) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) + 1 if last else size
+        else:
+            start, end = max(0, size - int(last)), size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= end:
+        raise ValueError(header)
+    return start, end
+
+
+async def _report_response(request: Request, scope: str, key: str, fmt: str, title: str) -> Response:
+    """Serves a CSV report, or its PDF rendered on demand, with ETag and Range support."""
+    csv_path = report_path(scope, key)
+    if fmt not in ("csv", "pdf") or not valid_report_key(key) or not os.path.exists(csv_path):
+        return JSONResponse(content={"message": "Report not found."}, status_code=404)
+    path = csv_path if fmt == "csv" else await asyncio.to_thread(ensure_pdf, csv_path, title)
+    data, etag, mtime = await asyncio.to_thread(read_snapshot, path)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{key}_report.{fmt}"',
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/pdf"
+    # A range only applies to the version named by If-Range, if given.
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = _byte_range(request.headers.get("range"), len(data))
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(data)}"
+            return Response(data[start:end], status_code=206, media_type=media_type, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
+
+
+@app.get("/runs/{run_id}/report.{fmt}")
+async def run_report(run_id: str, fmt: str, request: Request):
+    """
+    The CSV or PDF report of one summarize run (a job's run id is its job id). The CSV
+    grows while the run is in progress; the PDF is rendered on the first request after
+    the CSV changes.
+    """
+    return await _report_response(request, RUN_SCOPE, run_id, fmt, f"Document Summaries - run {run_id}")
+
+
+@app.get("/folders/{folder_id}/report.{fmt}")
+async def folder_report(folder_id: str, fmt: str, request: Request):
+    """The CSV or PDF report of a folder: the latest summary of every file summarized from it."""
+    return await _report_response(request, FOLDER_SCOPE, folder_id, fmt, f"Document Summaries - folder {folder_id}")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: stage and request latencies, bytes, characters, tokens, cache hits and errors."""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
+@app.get("/rate-limits")
+async def rate_limits():
+    """
+    Returns retry, throttling and adaptive concurrency counters for the Drive and LLM backends.
+    """
+    return rate_stats()
+
+
 @app.get("/view-summaries", response_class=JSONResponse)
 async def view_summaries(request: Request):
     """
@@ -226,51 +804,110 @@ async def view_summaries(request: Request):
 
 # This new endpoint will actually render the HTML for the summaries
 @app.get("/rendered-summaries-html", response_class=HTMLResponse, include_in_schema=False)
-async def rendered_summaries_html(request: Request):
+async def rendered_summaries_html(
+    request: Request,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    sort: str = Query("updated", pattern="^(updated|name)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    folder_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+):
     """
-    Renders the HTML page displaying all generated summaries,
+    Renders the HTML page displaying the generated summaries one page at a time,
     including links to view individual summary text files and overall reports.
+    Summaries come from the summary index, so render time does not depend on how
+    many summaries exist; unchanged pages are answered with 304 Not Modified.
+    Pages are addressed by the after/before cursors of the Next and Previous links;
+    page only numbers them for display.
     """
-    summaries_dir = "summaries"
-    summaries_list = []
+    try:
+        after_key = decode_cursor(sort, after) if after else None
+        before_key = decode_cursor(sort, before) if before else None
+    except ValueError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+    if after_key is None and before_key is None:
+        page = 1
+
+    index = await asyncio.to_thread(get_summary_index)
+    version, last_modified = await asyncio.to_thread(index.state)
+
     report_links = { # Initialize report_links here
         "csv": None,
         "pdf": None
     }
+    # Link the report matching the filter: the job's run, the folder, or else the latest run.
+    if job_id:
+        scope, key = RUN_SCOPE, job_id
+    elif folder_id:
+        scope, key = FOLDER_SCOPE, folder_id
+    else:
+        scope, key = RUN_SCOPE, await asyncio.to_thread(latest_run_report)
+    if valid_report_key(key) and os.path.exists(report_path(scope, key)):
+        base = f"/{scope}/{key}/report"
+        report_links = {"csv": f"{base}.csv", "pdf": f"{base}.pdf"}
+        # A newer run changes the linked report without touching the index.
+        last_modified = max(last_modified, os.path.getmtime(report_path(scope, key)))
+
+    # The page only changes when the index or the linked report does, so both validate every query.
+    etag_source = f"{version}|{report_links['csv']}|{request.url.query}"
+    etag = '"' + hashlib.sha1(etag_source.encode("utf-8")).hexdigest() + '"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        cache_headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=cache_headers)
+    elif last_modified and request.headers.get("if-modified-since"):
+        try:
+            if_modified_since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            if_modified_since = None
+        if if_modified_since is not None and int(last_modified) <= if_modified_since:
+            return Response(status_code=304, headers=cache_headers)
+
+    rows, has_more = await asyncio.to_thread(
+        index.page, per_page, sort, order, folder_id, job_id, after_key, before_key
+    )
+    summaries_list = [
+        {
+            "file_name": row["file_name"],
+            "summary": row["summary"],
+            # The '/summaries/' part matches the app.mount("/summaries", ...)
+            "summary_file_url": f"/summaries/{row['summary_file']}",
+            "folder_id": row["folder_id"],
+        }
+        for row in rows
+    ]
+
+    params = {"per_page": per_page, "sort": sort, "order": order}
+    if folder_id:
+        params["folder_id"] = folder_id
+    if job_id:
+        params["job_id"] = job_id
+    # Paging backwards, more rows means an earlier page; paging forwards, a later one.
+    has_prev = has_more if before_key is not None else after_key is not None
+    has_next = before_key is not None or has_more
+    pagination = {
+        "page": page,
+        "prev_url": (
+            f"?{urlencode({**params, 'before': encode_cursor(sort, rows[0]), 'page': max(page - 1, 1)})}"
+            if rows and has_prev else None
+        ),
+        "next_url": (
+            f"?{urlencode({**params, 'after': encode_cursor(sort, rows[-1]), 'page': page + 1})}"
+            if rows and has_next else None
+        ),
+        "folder_id": folder_id,
+        "job_id": job_id,
+    }
 
-    # Populate summaries_list with data and individual summary file URLs
-    if os.path.exists(summaries_dir):
-        for fname in os.listdir(summaries_dir):
-            if fname.endswith("_summary.txt"):
-                file_name_without_ext = os.path.splitext(fname)[0].replace("_summary", "")
-                summary_text = ""
-                with open(os.path.join(summaries_dir, fname), "r", encoding="utf-8") as f:
-                    summary_text = f.read()
-                
-                # Construct the URL for the raw summary text file
-                # The '/summaries/' part matches the app.mount("/summaries", ...)
-                summary_file_url = f"/summaries/{fname}" 
-                
-                summaries_list.append({
-                    "file_name": file_name_without_ext,
-                    "summary": summary_text,
-                    "summary_file_url": summary_file_url 
-                })
-    
-    # Check for generated reports and create their URLs
-    reports_dir = "reports"
-    if os.path.exists(reports_dir):
-        csv_report_name = "summaries_report.csv"
-        pdf_report_name = "summaries_report.pdf"
-
-        if os.path.exists(os.path.join(reports_dir, csv_report_name)):
-            report_links["csv"] = f"/reports/{csv_report_name}"
-        if os.path.exists(os.path.join(reports_dir, pdf_report_name)):
-            report_links["pdf"] = f"/reports/{pdf_report_name}"
-
-
-    return templates.TemplateResponse("summaries.html", {
-        "request": request,
+    return templates.TemplateResponse(request, "summaries.html", {
         "summaries": summaries_list,
-        "report_links": report_links 
-    })
+        "report_links": report_links,
+        "pagination": pagination
+    }, headers=cache_headers)
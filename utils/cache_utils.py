@@ -0,0 +1,141 @@
+# cache_utils.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+# Persistent summary cache location and size limit (bytes of stored text + summary).
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join("cache", "summary_cache.db"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def make_cache_key(checksum: Optional[str], settings: Dict) -> Optional[str]:
+    """
+    Builds a content-addressed key from a Drive md5Checksum and the summary settings.
+    Returns None when the file has no checksum (e.g. native Google Docs), which disables caching for it.
+    """
+    if not checksum:
+        return None
+    payload = json.dumps({"checksum": checksum, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    SQLite-backed cache of extracted text and summaries with LRU eviction.
+
+    Entries are keyed by make_cache_key(); text is stored zlib-compressed.
+    A single connection is shared between threads and guarded by a lock.
+    The total size is kept in a meta row, updated in the same transaction as the
+    entries, so a put only scans for eviction when the cache is over its limit.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, max_bytes: int = SUMMARY_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                file_name TEXT,
+                summary TEXT NOT NULL,
+                text BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_access ON summaries (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Caches created before the meta row existed are summed once.
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) "
+            "SELECT 'total_size', COALESCE(SUM(size), 0) FROM summaries"
+        )
+        self._conn.commit()
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        """Returns {"summary", "text"} for a cached key and marks it as recently used, or None."""
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, text FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        summary, text = row
+        return {"summary": summary, "text": zlib.decompress(text).decode("utf-8")}
+
+    def put(self, key: Optional[str], file_name: str, text: str, summary: str):
+        """Stores an entry and evicts least recently used entries beyond max_bytes."""
+        if key is None:
+            return
+        blob = zlib.compress(text.encode("utf-8"))
+        size = len(blob) + len(summary.encode("utf-8"))
+        with self._lock:
+            # IMMEDIATE so other processes cannot change the entry between reading its old size and replacing it.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, file_name, summary, text, size, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, file_name, summary, blob, size, time.time()),
+                )
+                self._add_size(size - (row[0] if row else 0))
+                self._evict()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _add_size(self, delta: int):
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_size'", (delta,))
+
+    def _evict(self):
+        total = self._conn.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM summaries ORDER BY last_access ASC")
+        stale = []
+        freed = 0
+        for key, size in rows:
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM summaries WHERE key = ?", stale)
+        self._add_size(-freed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.execute("UPDATE meta SET value = 0 WHERE key = 'total_size'")
+            self._conn.commit()
+
+
+_summary_cache: Optional[SummaryCache] = None
+_summary_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """Returns the process-wide summary cache, opening it on first use."""
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache()
+        return _summary_cache
@@ -0,0 +1,144 @@
+# dedup_utils.py
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Estimated Jaccard similarity of word shingles above which two documents count as duplicates.
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+MINHASH_PERMUTATIONS = int(os.getenv("DEDUP_MINHASH_PERMUTATIONS", "128"))
+SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+# Documents with fewer words are only matched exactly; their shingle sets are too small to compare.
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "20"))
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_HASH_BLOCK = 8192
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+Fingerprint = Tuple[str, Optional["np.ndarray"]]
+
+
+@lru_cache(maxsize=1)
+def _permutations():
+    """Hash permutation coefficients (a, b); numpy is imported on first use."""
+    import numpy as np
+
+    # Fixed seed: signatures must agree between processes and runs.
+    rng = np.random.RandomState(1)
+    return (
+        rng.randint(1, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64),
+        rng.randint(0, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64),
+    )
+
+
+def normalize_words(text: str) -> List[str]:
+    """Case-folded words with accents, punctuation and layout removed."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WORD_PATTERN.findall(text)
+
+
+def minhash_signature(words: List[str], shingle_words: int = SHINGLE_WORDS) -> "np.ndarray":
+    """MinHash signature of the document's word shingles, one value per permutation."""
+    import numpy as np
+
+    perm_a, perm_b = _permutations()
+    shingles = {" ".join(words[i:i + shingle_words]) for i in range(max(1, len(words) - shingle_words + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    signature = np.full(MINHASH_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    # Blocks keep the permutations x shingles matrix small for long documents.
+    for start in range(0, len(hashes), _HASH_BLOCK):
+        block = hashes[start:start + _HASH_BLOCK]
+        permuted = (perm_a[:, None] * block[None, :] + perm_b[:, None]) % _MERSENNE_PRIME
+        signature = np.minimum(signature, permuted.min(axis=1))
+    return signature
+
+
+def fingerprint(text: str) -> Optional[Fingerprint]:
+    """
+    (exact hash, MinHash signature) of a document's normalized text, or None for empty
+    text. The signature is None for documents too short to compare approximately.
+    """
+    words = normalize_words(text)
+    if not words:
+        return None
+    exact = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+    signature = minhash_signature(words) if len(words) >= DEDUP_MIN_WORDS else None
+    return exact, signature
+
+
+def lsh_bands(threshold: float, permutations: int = MINHASH_PERMUTATIONS) -> Tuple[int, int]:
+    """
+    Picks (bands, rows) with bands * rows == permutations whose LSH threshold
+    (1 / bands) ** (1 / rows) sits just below the similarity threshold, so documents
+    at the threshold almost always share a band and candidates are then checked exactly.
+    """
+    best = (permutations, 1)
+    for rows in range(1, permutations + 1):
+        if permutations % rows:
+            continue
+        bands = permutations // rows
+        if (1 / bands) ** (1 / rows) <= threshold - 0.1:
+            best = (bands, rows)
+    return best
+
+
+class DuplicateDetector:
+    """
+    Finds exact and near-duplicate documents among those added so far.
+
+    Exact duplicates share the hash of their normalized text; near duplicates are found
+    through MinHash LSH buckets and confirmed when the estimated Jaccard similarity of
+    their signatures reaches the threshold. The first document of a group is canonical.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold)
+        self._exact: Dict[str, str] = {}
+        self._signatures: Dict[str, "np.ndarray"] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, doc_id: str, fp: Optional[Fingerprint]) -> Optional[Tuple[str, str]]:
+        """
+        Registers a document and returns (canonical id, "exact" or "near") when it
+        duplicates an earlier one, or None when it is new (and now canonical itself).
+        """
+        if fp is None:
+            return None
+        exact, signature = fp
+        with self._lock:
+            if exact in self._exact:
+                return self._exact[exact], "exact"
+            self._exact[exact] = doc_id
+            if signature is None:
+                return None
+
+            keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+            candidates = []
+            for key in keys:
+                for candidate in self._buckets.get(key, ()):
+                    if candidate not in candidates:
+                        candidates.append(candidate)
+            for candidate in candidates:
+                if (self._signatures[candidate] == signature).mean() >= self.threshold:
+                    # The exact hash now points at the canonical document too.
+                    self._exact[exact] = candidate
+                    return candidate, "near"
+
+            self._signatures[doc_id] = signature
+            for key in keys:
+                self._buckets.setdefault(key, []).append(doc_id)
+            return None
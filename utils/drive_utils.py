@@ -1,70 +1,431 @@
 # drive_utils.py
 import io
 import os
-from typing import List, Dict, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.auth.transport.requests import Request
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Iterator, List, Dict, Optional, Union
+from utils.parse_utils import MIME_EXTENSIONS
+from utils.rate_utils import drive_rate
+
+# The Google API client libraries are slow to import, so they are imported on first use.
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 # Only readonly access
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 
-class DriveClient:
+# Bytes fetched per HTTP request when downloading (MediaIoBaseDownload's default is 100 MB).
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(100 * 1024 * 1024)))
+# Downloads larger than this are spilled from memory to a temporary file.
+DOWNLOAD_SPOOL_THRESHOLD = int(os.getenv("DOWNLOAD_SPOOL_THRESHOLD", str(32 * 1024 * 1024)))
+# Socket timeout for the keep-alive connections held by DriveClientManager.
+DRIVE_HTTP_TIMEOUT = int(os.getenv("DRIVE_HTTP_TIMEOUT", "60"))
+# Idle Drive services (each holding a keep-alive connection) DriveClientManager keeps for reuse.
+DRIVE_POOL_SIZE = int(os.getenv("DRIVE_POOL_SIZE", "32"))
+
+# --- Folder crawl settings ---
+# Subfolder levels listed below the requested folder (0 lists only its direct children).
+CRAWL_MAX_DEPTH = int(os.getenv("DRIVE_CRAWL_MAX_DEPTH", "10"))
+# Folders listed at the same time.
+CRAWL_CONCURRENCY = int(os.getenv("DRIVE_CRAWL_CONCURRENCY", "8"))
+# Largest page size files.list allows.
+LIST_PAGE_SIZE = 1000
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SHORTCUT_MIME_TYPE = "application/vnd.google-apps.shortcut"
+# Native Google files have no binary content; they are exported to a format the parsers read,
+# given as (export MIME type, extension added to the file name).
+EXPORT_FORMATS = {
+    "application/vnd.google-apps.document": ("text/plain", ".txt"),
+    "application/vnd.google-apps.spreadsheet": ("text/csv", ".csv"),
+    "application/vnd.google-apps.presentation": ("text/plain", ".txt"),
+}
+_FILE_FIELDS = "id, name, mimeType, md5Checksum, modifiedTime, size"
+_LIST_FIELDS = f"nextPageToken, files({_FILE_FIELDS}, shortcutDetails(targetId, targetMimeType))"
+
+
+def load_credentials(credentials_path: str, token_path: str, creds: Optional["Credentials"] = None) -> "Credentials":
+    """Loads (or refreshes) the stored OAuth token, running the consent flow only when there is none."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    if creds is None and os.path.exists(token_path):
+        try:
+            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+        except Exception:
+            creds = None
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(token_path, "w") as token:
+            token.write(creds.to_json())
+    return creds
+
+
+def prepare_file(item: Dict, path: str) -> Optional[Dict]:
+    """
+    Turns a Drive file resource into a pipeline file record, or None if it cannot be parsed.
+    Native Google files get their export format: "exportMimeType" is set, "mimeType" becomes
+    the export type and its extension is added to the name, so the parsers treat them like
+    any other file. Exports have no md5Checksum, so they are not cached.
+    """
+    mime = item.get("mimeType")
+    record = dict(item, path=path)
+    record.pop("shortcutDetails", None)
+    if mime in EXPORT_FORMATS:
+        export_mime, extension = EXPORT_FORMATS[mime]
+        record.update(
+            name=item["name"] + extension,
+            path=path + extension,
+            mimeType=export_mime,
+            exportMimeType=export_mime,
+            googleMimeType=mime,
+        )
+        return record
+    if mime in MIME_EXTENSIONS:
+        return record
+    return None
+
+
+class DownloadBuffer:
+    """
+    Write target for downloads that keeps content in memory and spills it to a
+    named temporary file once it grows beyond spool_threshold bytes.
+
+    source() returns something extract_text() accepts and that can be sent to a
+    worker process: the bytes themselves, or the temp file path once spilled.
+    """
+
+    def __init__(self, spool_threshold: int = DOWNLOAD_SPOOL_THRESHOLD, suffix: str = ""):
+        self.spool_threshold = spool_threshold
+        self.suffix = suffix
+        self.path: Optional[str] = None
+        self.size = 0
+        self._memory: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    def write(self, data: bytes) -> int:
+        if self._file is None and self._memory.tell() + len(data) > self.spool_threshold:
+            self._file = tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix)
+            self._file.write(self._memory.getvalue())
+            self.path = self._file.name
+            self._memory = None
+        (self._file or self._memory).write(data)
+        self.size += len(data)
+        return len(data)
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def finish(self):
+        """Flushes a spilled buffer so its temp file can be read by path."""
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def source(self) -> Union[bytes, str]:
+        self.finish()
+        return self.path if self.spilled else self._memory.getvalue()
+
+    def close(self):
+        """Releases the buffer and deletes the temp file, if any."""
+        self.finish()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._memory = None
+
+class DriveClientManager:
+    """
+    Process-wide Drive access shared by every request.
+
+    Credentials are loaded once and refreshed under a lock when they expire, and the
+    discovery document is read once. Service objects, each backed by its own keep-alive
+    httplib2 connection, are leased to one caller at a time (httplib2 is not thread-safe)
+    and returned to an idle pool afterwards. The pool outlives the short-lived worker
+    threads of each run, so connections are reused across requests.
+    """
+
     def __init__(self, credentials_path: str = "client_secret.json", token_path: str = "token.json"):
         self.credentials_path = credentials_path
         self.token_path = token_path
-        self.creds: Optional[Credentials] = None
-        self.service = None
+        self.creds: Optional["Credentials"] = None
+        self._lock = threading.Lock()
+        self._discovery_doc: Optional[str] = None
+        # Idle (service, credentials it was built with) pairs, most recently used last.
+        self._idle: List[tuple] = []
+        self._idle_lock = threading.Lock()
+
+    def start(self):
+        """
+        Loads the discovery document and any stored token up front (part of the optional
+        startup warm-up). The interactive consent flow is left to the first request, as before.
+        """
+        self._get_discovery_doc()
+        if os.path.exists(self.token_path):
+            self.credentials()
+
+    def credentials(self) -> "Credentials":
+        """Returns valid shared credentials, refreshing them once for all threads when they expire."""
+        creds = self.creds
+        if creds is not None and creds.valid:
+            return creds
+        with self._lock:
+            if self.creds is None or not self.creds.valid:
+                self.creds = load_credentials(self.credentials_path, self.token_path, self.creds)
+            return self.creds
+
+    def _get_discovery_doc(self) -> str:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    from googleapiclient.discovery_cache import get_static_doc
+
+                    self._discovery_doc = get_static_doc("drive", "v3")
+        return self._discovery_doc
+
+    def _build_service(self, creds: "Credentials"):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build, build_from_document
+
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT))
+        discovery_doc = self._get_discovery_doc()
+        if discovery_doc is not None:
+            return build_from_document(discovery_doc, http=http)
+        return build("drive", "v3", http=http)
+
+    @contextmanager
+    def lease(self) -> Iterator:
+        """
+        Lends the caller a Drive service for exclusive use, reusing an idle one (and its
+        open connection) when there is one. Services built with replaced credentials are
+        dropped rather than reused.
+        """
+        creds = self.credentials()
+        service = None
+        with self._idle_lock:
+            while self._idle and service is None:
+                candidate, candidate_creds = self._idle.pop()
+                if candidate_creds is creds:
+                    service = candidate
+        if service is None:
+            service = self._build_service(creds)
+        try:
+            yield service
+        finally:
+            with self._idle_lock:
+                if len(self._idle) < DRIVE_POOL_SIZE:
+                    self._idle.append((service, creds))
+
+    def client(self) -> "DriveClient":
+        return DriveClient(self.credentials_path, self.token_path, manager=self)
+
+
+class DriveClient:
+    def __init__(
+        self,
+        credentials_path: str = "client_secret.json",
+        token_path: str = "token.json",
+        manager: Optional[DriveClientManager] = None,
+    ):
+        self.credentials_path = credentials_path
+        self.token_path = token_path
+        self.manager = manager
+        self.creds: Optional["Credentials"] = None
+        # httplib2 connections are not thread-safe, so each thread gets its own service object.
+        self._local = threading.local()
+
+    @property
+    def service(self):
+        """Drive service for the calling thread when there is no manager, built on first use."""
+        service = getattr(self._local, "service", None)
+        if service is None and self.creds is not None:
+            from googleapiclient.discovery import build
+
+            service = build("drive", "v3", credentials=self.creds)
+            self._local.service = service
+        return service
+
+    @service.setter
+    def service(self, value):
+        self._local.service = value
+
+    @contextmanager
+    def _service(self) -> Iterator:
+        """Drive service to use for one request (or one download): leased from the manager if there is one."""
+        if self.manager is not None:
+            with self.manager.lease() as service:
+                yield service
+        else:
+            yield self.service
 
     def authenticate(self):
         """Authenticate user via OAuth2, store token for reuse."""
-        if os.path.exists(self.token_path):
-            try:
-                self.creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
-            except Exception:
-                self.creds = None
+        if self.manager is not None:
+            # Shared credentials are already loaded; this only refreshes them if needed.
+            self.creds = self.manager.credentials()
+            return
 
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-                self.creds = flow.run_local_server(port=0)
-            with open(self.token_path, "w") as token:
-                token.write(self.creds.to_json())
+        from googleapiclient.discovery import build
 
+        self.creds = load_credentials(self.credentials_path, self.token_path)
         self.service = build("drive", "v3", credentials=self.creds)
 
-    def list_files_in_folder(self, folder_id: str) -> List[Dict]:
-        """List PDF/DOCX/TXT files in the given folder."""
-        mime_filters = [
-            "application/pdf",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "text/plain",
-        ]
-        q = f"'{folder_id}' in parents and ({' or '.join([f'mimeType = \"{m}\"' for m in mime_filters])}) and trashed = false"
-        files = []
+    def list_files_in_folder(self, folder_id: str, max_depth: Optional[int] = None) -> List[Dict]:
+        """
+        Lists the supported files in the given folder and its subfolders, up to max_depth
+        levels down (CRAWL_MAX_DEPTH by default; 0 lists only direct children).
+
+        Subfolders are listed concurrently, CRAWL_CONCURRENCY at a time. Shortcuts are
+        followed to their target file or folder, and every folder and file is visited
+        once, so shortcut cycles and files reachable by several paths are harmless.
+        Native Google Docs, Sheets and Slides are included as exports (see prepare_file).
+        Each file carries "path", its location below the listed folder.
+        """
+        max_depth = CRAWL_MAX_DEPTH if max_depth is None else max_depth
+        visited_folders = {folder_id}
+        seen_files = set()
+        files: List[Dict] = []
+        shortcut_targets = []
+
+        def add_file(item: Dict, path: str):
+            record = prepare_file(item, path)
+            if record is not None and record["id"] not in seen_files:
+                seen_files.add(record["id"])
+                files.append(record)
+
+        with ThreadPoolExecutor(max_workers=CRAWL_CONCURRENCY, thread_name_prefix="drive-crawl") as pool:
+            pending = {pool.submit(self._list_children, folder_id): ("", 0)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix, depth = pending.pop(future)
+                    try:
+                        children = future.result()
+                    except Exception as e:
+                        if depth == 0:
+                            raise
+                        # An unreadable subfolder should not fail the whole listing.
+                        print(f"Could not list folder {prefix.rstrip('/')}: {e}")
+                        continue
+                    for item in children:
+                        path = prefix + item["name"]
+                        mime = item["mimeType"]
+                        target_id = item["id"]
+                        if mime == SHORTCUT_MIME_TYPE:
+                            details = item.get("shortcutDetails") or {}
+                            target_id, mime = details.get("targetId"), details.get("targetMimeType")
+                            if target_id is None:
+                                continue
+                            if mime != FOLDER_MIME_TYPE:
+                                shortcut_targets.append((target_id, path))
+                                continue
+                        if mime == FOLDER_MIME_TYPE:
+                            if depth < max_depth and target_id not in visited_folders:
+                                visited_folders.add(target_id)
+                                pending[pool.submit(self._list_children, target_id)] = (path + "/", depth + 1)
+                        else:
+                            add_file(item, path)
+
+            # Shortcut listings lack the target's checksum and size, so targets are fetched.
+            targets = [(target_id, path) for target_id, path in shortcut_targets if target_id not in seen_files]
+            fetched = pool.map(self._get_shortcut_target, [target_id for target_id, _ in targets])
+            for (_, path), item in zip(targets, fetched):
+                if item is not None:
+                    add_file(item, os.path.join(os.path.dirname(path), item["name"]))
+        return files
+
+    def _list_children(self, folder_id: str) -> List[Dict]:
+        """Every non-trashed item directly inside a folder, LIST_PAGE_SIZE per request."""
+        items = []
         page_token = None
         while True:
-            res = self.service.files().list(
-                q=q,
-                fields="nextPageToken, files(id, name, mimeType, webViewLink)",
-                pageToken=page_token,
-            ).execute()
-            files.extend(res.get("files", []))
+            with self._service() as service:
+                request = service.files().list(
+                    q=f"'{folder_id}' in parents and trashed = false",
+                    fields=_LIST_FIELDS,
+                    pageSize=LIST_PAGE_SIZE,
+                    pageToken=page_token,
+                )
+                res = drive_rate.call(request.execute)
+            items.extend(res.get("files", []))
             page_token = res.get("nextPageToken")
             if not page_token:
                 break
-        return files
+        return items
+
+    def _get_shortcut_target(self, file_id: str) -> Optional[Dict]:
+        try:
+            with self._service() as service:
+                request = service.files().get(fileId=file_id, fields=_FILE_FIELDS)
+                return drive_rate.call(request.execute)
+        except Exception as e:
+            # Shortcuts can point at files the user cannot open.
+            print(f"Could not resolve shortcut target {file_id}: {e}")
+            return None
 
-    def download_file(self, file_id: str, dest_path: str) -> str:
-        """Download a file by ID into dest_path."""
-        request = self.service.files().get_media(fileId=file_id)
+    def get_file(self, file_id: str) -> Dict:
+        """Metadata of one file, with the same fields as list_files_in_folder plus parents."""
+        with self._service() as service:
+            request = service.files().get(fileId=file_id, fields=f"{_FILE_FIELDS}, parents")
+            item = drive_rate.call(request.execute)
+        return prepare_file(item, item["name"]) or item
+
+    def download_file(
+        self,
+        file_id: str,
+        dest_path: str,
+        chunk_size: Optional[int] = None,
+        export_mime_type: Optional[str] = None,
+    ) -> str:
+        """Download a file by ID into dest_path (exported to export_mime_type for native Google files)."""
         with io.FileIO(dest_path, "wb") as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done: 
-                _, done = downloader.next_chunk()
+            self._download_into(file_id, fh, chunk_size, export_mime_type)
         return dest_path
+
+    def download_to_buffer(
+        self,
+        file_id: str,
+        chunk_size: Optional[int] = None,
+        spool_threshold: Optional[int] = None,
+        suffix: str = "",
+        export_mime_type: Optional[str] = None,
+    ) -> DownloadBuffer:
+        """
+        Download a file by ID into memory, spilling to a temp file only above spool_threshold.
+        Native Google files are exported to export_mime_type instead.
+        The caller must close() the returned buffer.
+        """
+        buffer = DownloadBuffer(spool_threshold or DOWNLOAD_SPOOL_THRESHOLD, suffix=suffix)
+        try:
+            self._download_into(file_id, buffer, chunk_size, export_mime_type)
+        except Exception:
+            buffer.close()
+            raise
+        buffer.finish()
+        return buffer
+
+    def _download_into(self, file_id: str, fh, chunk_size: Optional[int] = None, export_mime_type: Optional[str] = None):
+        from googleapiclient.http import MediaIoBaseDownload
+
+        # The service (and its connection) is held for the whole download.
+        with self._service() as service:
+            if export_mime_type:
+                request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
+            else:
+                request = service.files().get_media(fileId=file_id)
+            downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size or DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                # A failed chunk is retried from the last completed offset.
+                _, done = drive_rate.call(downloader.next_chunk)
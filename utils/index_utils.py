@@ -0,0 +1,205 @@
+# index_utils.py
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+SUMMARY_INDEX_PATH = os.getenv("SUMMARY_INDEX_PATH", os.path.join("index", "summaries.db"))
+
+# Sort keys accepted by SummaryIndex.page(), mapped to indexed columns.
+SORT_COLUMNS = {"updated": "updated_at", "name": "file_name"}
+
+
+class SummaryIndex:
+    """
+    SQLite index of generated summaries, kept up to date as summaries are written,
+    so the summaries view can page, sort and filter without reading the summaries/ folder.
+
+    A version counter in the meta table changes on every write and is used for ETags.
+    """
+
+    def __init__(self, path: str = SUMMARY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                summary_file TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                file_id TEXT,
+                folder_id TEXT,
+                job_id TEXT,
+                summary TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            DROP INDEX IF EXISTS idx_summaries_updated;
+            DROP INDEX IF EXISTS idx_summaries_name;
+            DROP INDEX IF EXISTS idx_summaries_folder;
+            DROP INDEX IF EXISTS idx_summaries_job;
+            CREATE INDEX IF NOT EXISTS idx_summaries_updated_key ON summaries (updated_at, summary_file);
+            CREATE INDEX IF NOT EXISTS idx_summaries_name_key ON summaries (file_name, summary_file);
+            CREATE INDEX IF NOT EXISTS idx_summaries_folder_key ON summaries (folder_id, updated_at, summary_file);
+            CREATE INDEX IF NOT EXISTS idx_summaries_job_key ON summaries (job_id, updated_at, summary_file);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('last_modified', 0);
+            """
+        )
+        self._conn.commit()
+
+    def _touch(self, now: float):
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self._conn.execute("UPDATE meta SET value = ? WHERE key = 'last_modified'", (now,))
+
+    def upsert(
+        self,
+        summary_file: str,
+        file_name: str,
+        summary: str,
+        file_id: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries "
+                "(summary_file, file_name, file_id, folder_id, job_id, summary, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (summary_file, file_name, file_id, folder_id, job_id, summary, now),
+            )
+            self._touch(now)
+            self._conn.commit()
+
+    def remove(self, summary_file: str, file_id: Optional[str] = None):
+        """Removes a summary's row; with file_id, only while that Drive file still owns it."""
+        query, params = "DELETE FROM summaries WHERE summary_file = ?", [summary_file]
+        if file_id is not None:
+            query += " AND file_id = ?"
+            params.append(file_id)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            if cursor.rowcount:
+                self._touch(time.time())
+            self._conn.commit()
+
+    def owner(self, summary_file: str) -> Optional[str]:
+        """Drive file id the summary was last written for, if indexed."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id FROM summaries WHERE summary_file = ?", (summary_file,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def backfill(self, summaries_dir: str = "summaries") -> int:
+        """Indexes existing *_summary.txt files once, when the index is still empty."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM summaries LIMIT 1").fetchone() is not None:
+                return 0
+        if not os.path.isdir(summaries_dir):
+            return 0
+        rows = []
+        for entry in os.scandir(summaries_dir):
+            if not entry.name.endswith("_summary.txt"):
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
+                summary = f.read()
+            file_name = entry.name[: -len("_summary.txt")]
+            rows.append((entry.name, file_name, summary, entry.stat().st_mtime))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO summaries (summary_file, file_name, summary, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if rows:
+                self._touch(time.time())
+            self._conn.commit()
+        return len(rows)
+
+    def state(self) -> Tuple[int, float]:
+        """Returns (version, last_modified timestamp) for cache validation."""
+        with self._lock:
+            values = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        return int(values["version"]), values["last_modified"]
+
+    def page(
+        self,
+        per_page: int = 50,
+        sort: str = "updated",
+        order: str = "desc",
+        folder_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        before: Optional[Tuple] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Returns one page of summaries and whether more rows follow in the paging direction.
+        after/before are (sort value, summary_file) keys from decode_cursor(): the page starts
+        right after or ends right before that row, found through the index instead of skipping rows.
+        """
+        column = SORT_COLUMNS.get(sort, "updated_at")
+        backward = before is not None
+        # A page before a cursor is read in the opposite order and flipped afterwards.
+        descending = (order != "asc") != backward
+        direction = "DESC" if descending else "ASC"
+        clauses, params = [], []
+        key = before if backward else after
+        if key is not None:
+            clauses.append(f"({column}, summary_file) {'<' if descending else '>'} (?, ?)")
+            params += list(key)
+        if folder_id:
+            clauses.append("folder_id = ?")
+            params.append(folder_id)
+        if job_id:
+            clauses.append("job_id = ?")
+            params.append(job_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # One extra row tells whether there is a next page without counting the whole table.
+        query = (
+            f"SELECT summary_file, file_name, file_id, folder_id, job_id, summary, updated_at "
+            f"FROM summaries {where} ORDER BY {column} {direction}, summary_file {direction} LIMIT ?"
+        )
+        params.append(per_page + 1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        keys = ("summary_file", "file_name", "file_id", "folder_id", "job_id", "summary", "updated_at")
+        items = [dict(zip(keys, row)) for row in rows[:per_page]]
+        if backward:
+            items.reverse()
+        return items, len(rows) > per_page
+
+
+def encode_cursor(sort: str, item: Dict) -> str:
+    """Opaque page cursor pointing at a row returned by SummaryIndex.page()."""
+    key = [sort, item[SORT_COLUMNS[sort]], item["summary_file"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(sort: str, cursor: str) -> Tuple:
+    """Returns the (sort value, summary_file) key of a cursor; raises ValueError if it is invalid or from another sort."""
+    try:
+        cursor_sort, value, summary_file = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid page cursor.") from e
+    if cursor_sort != sort:
+        raise ValueError("Page cursor belongs to another sort order.")
+    return value, summary_file
+
+
+_summary_index: Optional[SummaryIndex] = None
+_summary_index_lock = threading.Lock()
+
+
+def get_summary_index() -> SummaryIndex:
+    """Returns the process-wide summary index, opening it on first use."""
+    global _summary_index
+    with _summary_index_lock:
+        if _summary_index is None:
+            _summary_index = SummaryIndex()
+        return _summary_index
@@ -0,0 +1,223 @@
+# job_utils.py
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils.metrics_utils import get_trace_id, new_trace_id, reset_trace_id, set_trace_id
+
+# Jobs running at once, jobs allowed to wait for a worker, and finished jobs kept for status queries.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "20"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "200"))
+# Events kept per job for late subscribers and reconnects; a snapshot stands in for older ones.
+JOB_EVENT_LIMIT = int(os.getenv("JOB_EVENT_LIMIT", "1000"))
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the job queue is at its limit."""
+
+
+class Job:
+    """
+    A background folder run: status, per-file stage, results and an event stream.
+
+    The latest JOB_EVENT_LIMIT events are kept in order, with increasing ids, so a
+    subscriber that connects late or reconnects still receives what it missed.
+    """
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        # Jobs keep the trace id of the request that submitted them.
+        self.trace_id = get_trace_id() or new_trace_id()
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files: "OrderedDict[str, Dict]" = OrderedDict()
+        self.result: Optional[Dict] = None
+        self.reports: Dict[str, Optional[str]] = {"csv": None, "pdf": None}
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._events: Deque[Dict] = deque(maxlen=JOB_EVENT_LIMIT)
+        self._last_event_id = 0
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def publish(self, event: str, data: Dict):
+        self._last_event_id += 1
+        message = {"id": self._last_event_id, "event": event, "data": data}
+        self._events.append(message)
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    def subscribe(self, last_event_id: int = 0) -> asyncio.Queue:
+        """
+        Returns a queue that replays the events after last_event_id and then receives new ones.
+        If some of those events are no longer kept, a "snapshot" event with the job's
+        current state replaces them.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        oldest = self._events[0]["id"] if self._events else self._last_event_id + 1
+        if last_event_id < oldest - 1:
+            queue.put_nowait({"id": oldest - 1, "event": "snapshot", "data": self.to_dict(include_result=False)})
+        for message in self._events:
+            if message["id"] > last_event_id:
+                queue.put_nowait(message)
+        if not self.finished:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        if status == "running":
+            self.started_at = time.time()
+        if status in FINISHED_STATES:
+            self.finished_at = time.time()
+        self.publish("status", {"status": status, "error": error})
+        if self.finished:
+            self.publish("end", self.to_dict())
+            self._subscribers.clear()
+
+    def track_files(self, files: List[Dict]):
+        for f in files:
+            self.files[f["id"]] = {"file_id": f["id"], "file_name": f["name"], "stage": "queued"}
+        self.publish("files", {"total": len(files)})
+
+    def on_progress(self, f: Dict, stage: str, result: Optional[Dict] = None):
+        """FolderPipeline progress callback: records the file's stage and streams finished results."""
+        entry = self.files.setdefault(f["id"], {"file_id": f["id"], "file_name": f["name"]})
+        entry["stage"] = stage
+        if result is not None:
+            self.publish("result", {"file_id": f["id"], "stage": stage, **result})
+        else:
+            self.publish("stage", {"file_id": f["id"], "file_name": f["name"], "stage": stage})
+
+    def progress(self) -> Dict:
+        stages = [entry.get("stage") for entry in self.files.values()]
+        return {
+            "total": len(stages),
+            "done": sum(stage in ("done", "cached") for stage in stages),
+            "failed": stages.count("failed"),
+        }
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress(),
+            "files": list(self.files.values()),
+            "reports": self.reports,
+            "error": self.error,
+        }
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Bounded in-process job runner: a fixed number of worker tasks take jobs from a
+    queue that holds at most queue_limit waiting jobs; submit() raises QueueFullError
+    beyond that so callers can push back on clients. Cancelling a queued job frees its place.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Waiting jobs in submission order; each one adds a permit to _available.
+        self._pending: "OrderedDict[str, Tuple[Job, Callable[[Job], Awaitable[Dict]]]]" = OrderedDict()
+        self._available: Optional[asyncio.Semaphore] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._pending.clear()
+        self._available = asyncio.Semaphore(0)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for job in self.jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, kind: str, params: Dict[str, Any], runner: Callable[[Job], Awaitable[Dict]]) -> Job:
+        if len(self._pending) >= self.queue_limit:
+            raise QueueFullError(f"Job queue is full ({self.queue_limit} jobs waiting).")
+        job = Job(kind, params)
+        self._pending[job.id] = (job, runner)
+        self._available.release()
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a queued or running job. A queued job leaves the queue right away."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._pending.pop(job_id, None)
+            job.set_status("cancelled")
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            # Cancelled jobs leave their permit behind, so there may be nothing left to take.
+            if not self._pending:
+                continue
+            _, (job, runner) = self._pending.popitem(last=False)
+            job.set_status("running")
+            # The task copies the current context, so the job runs under its own trace id.
+            token = set_trace_id(job.trace_id)
+            job.task = asyncio.create_task(runner(job))
+            reset_trace_id(token)
+            try:
+                job.result = await job.task
+                job.set_status("completed")
+            except asyncio.CancelledError:
+                job.set_status("cancelled")
+                # Only a cancelled job ends here; a stopping manager also ends the worker.
+                if self._stopping:
+                    raise
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.set_status("failed", error=str(e))
@@ -0,0 +1,97 @@
+# manifest_utils.py
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+# One manifest per (folder, mode) records what the last run produced.
+MANIFEST_DIR = os.getenv("MANIFEST_DIR", "manifests")
+
+
+class FolderManifest:
+    """
+    Per-folder record of processed files, used by incremental runs.
+
+    Each entry is keyed by Drive file id and stores the file's name, modifiedTime and
+    md5Checksum at processing time, the output files written for it and the result
+    record returned to the client, so unchanged files can be reported without reprocessing.
+
+    When settings (a fingerprint of the extraction or summary settings) is set, entries
+    recorded under other settings count as changed. Entries from before settings were
+    recorded are taken as current.
+    """
+
+    def __init__(self, folder_id: str, mode: str, directory: str = MANIFEST_DIR):
+        self.folder_id = folder_id
+        self.mode = mode
+        self.path = os.path.join(directory, f"{folder_id}_{mode}.json")
+        self.entries: Dict[str, Dict] = {}
+        self.settings: Optional[str] = None
+
+    @classmethod
+    def load(cls, folder_id: str, mode: str, directory: str = MANIFEST_DIR) -> "FolderManifest":
+        manifest = cls(folder_id, mode, directory)
+        if os.path.exists(manifest.path):
+            try:
+                with open(manifest.path, "r", encoding="utf-8") as f:
+                    manifest.entries = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {manifest.path}: {e}")
+        return manifest
+
+    def save(self):
+        """Writes the manifest atomically so an interrupted run never leaves it half written."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"folder_id": self.folder_id, "mode": self.mode, "files": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, f: Dict) -> bool:
+        entry = self.entries.get(f["id"])
+        if entry is None:
+            return False
+        return (
+            entry.get("name") == f["name"]
+            and entry.get("modifiedTime") == f.get("modifiedTime")
+            and entry.get("md5Checksum") == f.get("md5Checksum")
+            and entry.get("settings", self.settings) == self.settings
+        )
+
+    def diff(self, files: List[Dict]) -> Tuple[List[Dict], List[Dict], List[str]]:
+        """Splits a listing into (added, changed) files and the ids of files no longer listed."""
+        listed_ids = {f["id"] for f in files}
+        added = [f for f in files if f["id"] not in self.entries]
+        changed = [f for f in files if f["id"] in self.entries and not self.is_current(f)]
+        removed = [file_id for file_id in self.entries if file_id not in listed_ids]
+        return added, changed, removed
+
+    def discard(self, file_id: str, owned_elsewhere: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Deletes the outputs recorded for a file, drops its entry and returns the removed
+        paths. A path that another file of the manifest also lists, or for which
+        owned_elsewhere(path) is true, now belongs to that file and is kept.
+        """
+        entry = self.entries.pop(file_id, None)
+        if entry is None:
+            return []
+        shared = {path for other in self.entries.values() for path in other.get("outputs", [])}
+        removed = []
+        for path in entry.get("outputs", []):
+            if path in shared or (owned_elsewhere is not None and owned_elsewhere(path)):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed.append(path)
+        return removed
+
+    def record(self, f: Dict, outputs: List[str], result: Dict):
+        self.entries[f["id"]] = {
+            "name": f["name"],
+            "modifiedTime": f.get("modifiedTime"),
+            "md5Checksum": f.get("md5Checksum"),
+            "settings": self.settings,
+            "outputs": outputs,
+            "result": result,
+        }
@@ -0,0 +1,91 @@
+# metrics_utils.py
+import contextvars
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Metrics live in the process that records them. Extraction runs in worker processes,
+# so its figures are reported back and recorded by the parent (see pipeline_utils).
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "docsum_http_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=_LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "docsum_stage_seconds",
+    "Time spent in a pipeline stage (list, download, extract, summarize, report)",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+EXTRACT_SECONDS = Histogram(
+    "docsum_extract_seconds", "Text extraction time per document", ["format", "pages"], buckets=_LATENCY_BUCKETS
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "docsum_llm_request_seconds", "LLM request latency, including retries", ["kind"], buckets=_LATENCY_BUCKETS
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "docsum_llm_first_token_seconds", "Time to the first token of streamed LLM replies", buckets=_LATENCY_BUCKETS
+)
+DOWNLOADED_BYTES = Counter("docsum_downloaded_bytes", "Bytes downloaded from Drive")
+EXTRACTED_CHARS = Counter("docsum_extracted_chars", "Characters of text extracted", ["format"])
+LLM_TOKENS = Counter("docsum_llm_tokens", "Tokens reported by the LLM API", ["type"])
+CACHE_LOOKUPS = Counter("docsum_cache_lookups", "Summary cache lookups", ["result"])
+DUPLICATES = Counter("docsum_duplicates", "Documents that reused a duplicate's summary", ["kind"])
+ERRORS = Counter("docsum_errors", "Errors by pipeline stage", ["stage"])
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]) -> contextvars.Token:
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token: contextvars.Token):
+    _trace_id.reset(token)
+
+
+def page_bucket(pages: Optional[int]) -> str:
+    """Page counts as a low-cardinality label."""
+    if pages is None:
+        return "n/a"
+    for limit in (1, 10, 100, 1000):
+        if pages <= limit:
+            return f"<={limit}"
+    return ">1000"
+
+
+@contextmanager
+def timed(stage: str, totals: Optional[Dict[str, float]] = None):
+    """Observes the block's duration in STAGE_SECONDS and, if given, adds it to totals[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if totals is not None:
+            totals[stage] = round(totals.get(stage, 0.0) + elapsed, 4)
+
+
+def record_llm_call(kind: str, seconds: float, usage=None):
+    LLM_REQUEST_SECONDS.labels(kind).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels("prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels("completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Returns the Prometheus exposition of every metric and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
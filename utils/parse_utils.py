@@ -1,58 +1,270 @@
-import fitz  # PyMuPDF
-import pdfplumber
-import docx
+import io
+import multiprocessing.util
 import os
-import pandas as pd
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Union
 
-def extract_text(file_path: str, mime: str = None) -> str:
+from utils.tabular_utils import TABLE_MAX_CHARS, summarize_csv, summarize_xls, summarize_xlsx
+
+# Extension to use when a source has no file name to take it from.
+MIME_EXTENSIONS = {
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "text/plain": ".txt",
+    "text/markdown": ".md",
+    "text/csv": ".csv",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "application/vnd.ms-excel": ".xls",
+}
+
+
+# --- PDF engine settings ---
+# PDFs with at least this many pages are split across a process pool.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(os.cpu_count() or 1)))
+# Optional extraction limits; 0 means unlimited.
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "0"))
+# Axis-aligned ruling lines on a page before it is treated as likely to hold a table.
+PDF_TABLE_RULING_THRESHOLD = int(os.getenv("PDF_TABLE_RULING_THRESHOLD", "6"))
+
+def extraction_settings() -> Dict:
+    """Settings that change the extracted text; part of summary and manifest cache keys."""
+    return {"pdf_max_pages": PDF_MAX_PAGES, "pdf_max_chars": PDF_MAX_CHARS, "table_max_chars": TABLE_MAX_CHARS}
+
+
+_page_pools: Dict[int, ProcessPoolExecutor] = {}
+# A forked child (e.g. a parse pool worker) inherits the parent's pools in an unusable
+# state, so it starts without any and creates its own.
+os.register_at_fork(after_in_child=_page_pools.clear)
+
+# The parsing libraries are slow to import, so each is imported on first use of its format.
+
+
+def warm_up():
+    """Imports every parsing library now instead of on first use (optional, at startup)."""
+    import docx
+    import fitz  # PyMuPDF
+    import openpyxl
+    import pdfplumber
+
+
+def _detect_extension(source, mime: Optional[str], file_name: Optional[str]) -> str:
+    # An explicit file name wins over the path, which may be an extension-less temp file.
+    if not file_name and isinstance(source, str):
+        file_name = source
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if not ext and mime:
+        ext = MIME_EXTENSIONS.get(mime, "")
+    return ext
+
+
+def _open_source(source: Union[str, bytes]):
+    """Returns something the parsing libraries can open: the path itself, or a fresh stream over the bytes."""
+    return source if isinstance(source, str) else io.BytesIO(source)
+
+
+def _open_pdf(source: Union[str, bytes]):
+    import fitz  # PyMuPDF
+
+    return fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+
+
+def _page_has_table(page) -> bool:
+    """
+    Cheap table detector: counts horizontal and vertical ruling lines drawn on the page.
+    pdfplumber's own table finding works off the same ruling lines, so pages without
+    them gain nothing from the slower pdfplumber pass.
+    """
+    import fitz  # PyMuPDF
+
+    page_area = abs(page.rect)
+    rulings = 0
+    for drawing in page.get_cdrawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(x0 - x1) < 1 or abs(y0 - y1) < 1:
+                    rulings += 1
+            elif item[0] == "re":
+                # Page-sized rectangles are backgrounds or frames, not table cells.
+                if abs(fitz.Rect(item[1])) < page_area * 0.9:
+                    rulings += 4
+            if rulings >= PDF_TABLE_RULING_THRESHOLD:
+                return True
+    return False
+
+
+def _extract_pdf_pages(source: Union[str, bytes], start: int, stop: int, max_chars: int = 0) -> List[str]:
+    """
+    Extracts pages [start, stop) with a fast PyMuPDF pass, re-extracting only the pages
+    that look like they hold tables with pdfplumber, whose layout-aware text keeps rows intact.
+    Stops early once max_chars characters have been collected.
+    """
+    pages: List[str] = []
+    table_pages: List[int] = []
+    chars = 0
+    with _open_pdf(source) as doc:
+        for number in range(start, stop):
+            page = doc[number]
+            page_text = page.get_text("text")
+            if _page_has_table(page):
+                table_pages.append(len(pages))
+            pages.append(page_text)
+            chars += len(page_text)
+            if max_chars and chars >= max_chars:
+                break
+
+    if table_pages:
+        try:
+            import pdfplumber
+
+            with pdfplumber.open(_open_source(source)) as pdf:
+                for offset in table_pages:
+                    page_text = pdf.pages[start + offset].extract_text()
+                    if page_text:
+                        pages[offset] = page_text
+        except Exception as e:
+            # The PyMuPDF text is still usable, just without table layout.
+            print(f"Pdfplumber failed on table pages, keeping PyMuPDF text. Error: {e}")
+    return pages
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    pool = _page_pools.get(workers)
+    if pool is None:
+        pool = _page_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        # A parse pool worker exits only after joining the processes it started, so its
+        # page pools are shut down first, before the queue feeding them is closed
+        # (multiprocessing closes queues at exit priority 10).
+        multiprocessing.util.Finalize(pool, pool.shutdown, exitpriority=20)
+    return pool
+
+
+def _extract_pdf(
+    source: Union[str, bytes],
+    max_pages: int = 0,
+    max_chars: int = 0,
+    page_workers: int = 1,
+) -> str:
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+    if max_pages:
+        page_count = min(page_count, max_pages)
+
+    if page_workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        return "\n".join(_extract_pdf_pages(source, 0, page_count, max_chars))
+
+    # Page workers reopen the document themselves, so in-memory PDFs are written out once
+    # rather than pickled to every worker.
+    temp_path = None
+    if isinstance(source, bytes):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            tmp.write(source)
+        source = temp_path = tmp.name
+
+    try:
+        # Several ranges per worker keeps the pool busy and lets a character budget stop early.
+        step = max(1, -(-page_count // (page_workers * 4)))
+        pool = _get_page_pool(page_workers)
+        futures = [
+            pool.submit(_extract_pdf_pages, source, start, min(start + step, page_count), max_chars)
+            for start in range(0, page_count, step)
+        ]
+        pages: List[str] = []
+        chars = 0
+        for future in futures:
+            if max_chars and chars >= max_chars:
+                future.cancel()
+                continue
+            for page_text in future.result():
+                pages.append(page_text)
+                chars += len(page_text)
+                if max_chars and chars >= max_chars:
+                    break
+        return "\n".join(pages)
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
+def page_count(source: Union[str, bytes], mime: str = None, file_name: str = None) -> Optional[int]:
+    """Number of pages of a PDF, or None for formats without pages (used for metrics)."""
+    if _detect_extension(source, mime, file_name) != ".pdf":
+        return None
+    try:
+        with _open_pdf(source) as doc:
+            return doc.page_count
+    except Exception:
+        return None
+
+
+def extract_text(
+    source: Union[str, bytes, BinaryIO],
+    mime: str = None,
+    file_name: str = None,
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    page_workers: Optional[int] = None,
+) -> str:
     """
     Extracts text from various document types based on file extension.
     Supports PDF, DOCX, TXT, MD, CSV, XLSX, XLS.
+
+    source is a file path, the document's bytes, or a binary file-like object.
+    For bytes and streams the format is taken from file_name, falling back to mime.
+    For PDFs, max_pages and max_chars stop extraction early (0 = unlimited) and
+    page_workers sets how many processes share the pages of large documents.
+    CSV and Excel files are streamed into a compact schema, statistics and sampled
+    rows of at most max_chars characters (TABLE_MAX_CHARS by default).
     """
-    ext = os.path.splitext(file_path)[1].lower()
+    ext = _detect_extension(source, mime, file_name)
+    label = source if isinstance(source, str) else (file_name or "<buffer>")
+    if not isinstance(source, (str, bytes)):
+        # Streams are read once so each parser (and fallback) can get its own view of the data.
+        source = source.read()
     text = ""
 
     if ext == ".pdf":
         try:
-            # Try pdfplumber first for better table extraction
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+            text = _extract_pdf(
+                source,
+                max_pages=PDF_MAX_PAGES if max_pages is None else max_pages,
+                max_chars=PDF_MAX_CHARS if max_chars is None else max_chars,
+                page_workers=PDF_PAGE_WORKERS if page_workers is None else page_workers,
+            )
         except Exception as e:
-            print(f"Pdfplumber failed for {file_path}, falling back to PyMuPDF. Error: {e}")
-            # Fallback to PyMuPDF if pdfplumber fails
-            try:
-                with fitz.open(file_path) as doc:
-                    for page in doc:
-                        text += page.get_text("text") + "\n"
-            except Exception as e_fitz:
-                text = f"(Error reading PDF with PyMuPDF: {e_fitz})"
+            print(f"PDF extraction failed for {label}. Error: {e}")
+            text = f"(Error reading PDF with PyMuPDF: {e})"
 
     elif ext == ".docx":
         try:
-            doc = docx.Document(file_path)
+            import docx
+
+            doc = docx.Document(_open_source(source))
             text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
         except Exception as e:
             text = f"(Error reading DOCX: {e})"
 
     elif ext in [".txt", ".md"]:
         # Using 'utf-8' with 'errors="ignore"' to handle potential encoding issues
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read()
+        if isinstance(source, str):
+            with open(source, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+        else:
+            text = source.decode("utf-8", errors="ignore")
 
     elif ext == ".csv":
         try:
-            df = pd.read_csv(file_path)
-            text = df.to_string(index=False) # Convert DataFrame to string
+            text = summarize_csv(source, max_chars or TABLE_MAX_CHARS)
         except Exception as e:
             text = f"(Error reading CSV: {e})"
 
     elif ext in [".xlsx", ".xls"]:
         try:
-            df = pd.read_excel(file_path)
-            text = df.to_string(index=False) # Convert DataFrame to string
+            summarize_sheets = summarize_xlsx if ext == ".xlsx" else summarize_xls
+            text = summarize_sheets(source, max_chars or TABLE_MAX_CHARS)
         except Exception as e:
             text = f"(Error reading Excel: {e})"
 
@@ -60,4 +272,3 @@ def extract_text(file_path: str, mime: str = None) -> str:
         text = f"(Unsupported file format: {ext})"
 
     return text.strip()
-
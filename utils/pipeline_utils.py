@@ -0,0 +1,728 @@
+# pipeline_utils.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.cache_utils import SummaryCache, make_cache_key
+from utils.dedup_utils import DuplicateDetector, fingerprint
+from utils.index_utils import SummaryIndex
+from utils.manifest_utils import FolderManifest
+from utils.metrics_utils import (
+    CACHE_LOOKUPS,
+    DOWNLOADED_BYTES,
+    DUPLICATES,
+    ERRORS,
+    EXTRACT_SECONDS,
+    EXTRACTED_CHARS,
+    page_bucket,
+    timed,
+)
+from utils.parse_utils import extract_text, extraction_settings, page_count
+from utils.rate_utils import download_slots
+from utils.store_utils import ParsedStore
+from utils.summarize_utils import (
+    BATCH_MAX_DOCS,
+    BATCH_TOKEN_BUDGET,
+    estimate_tokens,
+    is_small_document,
+    summarize_batch,
+    summarize_document,
+    summary_settings,
+)
+
+# Default concurrency for each stage. Each can be overridden per run.
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+SUMMARIZE_CONCURRENCY = int(os.getenv("SUMMARIZE_CONCURRENCY", "4"))
+# Processes a parse worker splits the pages of a large PDF over (PDF_PARALLEL_MIN_PAGES pages
+# or more). 0 gives each parse worker an equal share of the CPUs, but at least 2 on multi-core
+# hosts: with the default of one parse worker per CPU an equal share would be 1, which never
+# splits a PDF. Set 1 to turn page splitting off in the pipeline.
+PDF_PIPELINE_PAGE_WORKERS = int(os.getenv("PDF_PIPELINE_PAGE_WORKERS", "0"))
+# How long a partially filled batch of small documents waits for more before it is sent.
+BATCH_LINGER_SECONDS = float(os.getenv("SUMMARY_BATCH_LINGER_SECONDS", "1.0"))
+
+_SENTINEL = None
+_FLUSH = object()
+
+# Text extraction is CPU bound, so it runs in a process pool shared by all runs.
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool used for text extraction, creating it on first use."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Stop the shared extraction pool (called on application shutdown)."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def _extract_with_stats(source, mime: Optional[str], name: str, page_workers: int, with_fingerprint: bool = False):
+    """
+    Runs in a parse pool process: extracts the text and returns (text, pages, seconds,
+    fingerprint) so the parent process can record the extraction metrics. The dedup
+    fingerprint is computed here too, while the text is at hand and off the event loop.
+    """
+    start = time.perf_counter()
+    text = extract_text(source, mime, name, page_workers=page_workers)
+    elapsed = time.perf_counter() - start
+    fp = fingerprint(text) if with_fingerprint and not text.startswith("(Error") else None
+    return text, page_count(source, mime, name), elapsed, fp
+
+
+def interleave(groups: List[List[Dict]], weights: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Merges per-folder file lists into one schedule: each round takes weights[i] files
+    (1 by default, i.e. round-robin) from every folder with files left, so a huge
+    folder cannot hold back the small ones queued with it.
+    """
+    weights = weights or [1] * len(groups)
+    iterators = [iter(group) for group in groups]
+    active = list(range(len(groups)))
+    schedule: List[Dict] = []
+    while active:
+        for i in list(active):
+            for _ in range(max(1, weights[i])):
+                f = next(iterators[i], None)
+                if f is None:
+                    active.remove(i)
+                    break
+                schedule.append(f)
+    return schedule
+
+
+def summary_file_name(f: Dict) -> str:
+    """
+    File name of a Drive file's summary. It includes the file id, since files in different
+    subfolders (or the same folder) can share a name.
+    """
+    file_id = re.sub(r"[^A-Za-z0-9_-]", "_", f["id"])
+    return f"{os.path.splitext(f['name'])[0]}_{file_id}_summary.txt"
+
+
+def _save_summary(f: Dict, summary: str) -> str:
+    summary_path = os.path.join("summaries", summary_file_name(f))
+    with open(summary_path, "w", encoding="utf-8") as out:
+        out.write(summary)
+    return summary_path
+
+
+class FolderPipeline:
+    """
+    Staged download -> extract -> summarize pipeline for the files of a Drive folder.
+
+    Each stage has its own pool of workers connected to the next stage by a bounded
+    queue, so a slow stage applies backpressure instead of buffering the whole folder,
+    and total wall time approaches that of the slowest stage rather than the sum of all.
+    With summarize=False the pipeline stops after extraction and produces parse records.
+
+    When a SummaryCache is given, files whose Drive checksum and summary settings match a
+    cached entry are served from the cache without being downloaded or sent to the LLM.
+
+    With batch_small_files, small documents are packed into shared LLM requests
+    (see summarize_utils.summarize_batch) instead of one request each.
+
+    on_progress(file, stage, result) is called on the event loop as each file moves
+    through "downloading", "parsing" and "summarizing"; finished files report
+    "done", "cached" or "failed" together with their result.
+
+    Written summaries are also recorded in the SummaryIndex, if given, labelled
+    with folder_id and job_id so the summaries view can filter on them.
+
+    Extracted text goes to the ParsedStore, if given, which compresses and
+    full-text indexes it; no per-file text or JSON files are written.
+
+    With on_token(file, text), summaries are streamed: every text delta of a file's
+    final summary is passed on as it is generated (small-file batching is off then,
+    since a batched reply covers several files at once).
+
+    With dedup, extracted text is fingerprinted (see dedup_utils) and files that are
+    exact or near duplicates of another file in the run are not summarized: they wait
+    for the canonical file's summary and reuse it, and their result carries
+    "duplicate_of" with the canonical file's name. dedup_stats counts them by kind.
+
+    Each stage is timed into the Prometheus metrics, and stage_seconds holds this
+    run's totals per stage (summed over files, so stages overlap in wall time).
+
+    run_incremental() processes only the files a FolderManifest reports as added or
+    changed since the previous run and merges them with the recorded results.
+
+    run_folders() processes several folders as one run on the same workers, interleaving
+    their files (see interleave) so every folder makes progress. Files are labelled with
+    their own folder id in the index and store. Downloads also take a process-wide
+    download slot (rate_utils.download_slots), which caps them across concurrent runs.
+    """
+
+    def __init__(
+        self,
+        drive,
+        download_concurrency: Optional[int] = None,
+        parse_workers: Optional[int] = None,
+        summarize_concurrency: Optional[int] = None,
+        summarize: bool = True,
+        cache: Optional[SummaryCache] = None,
+        batch_small_files: bool = True,
+        on_progress: Optional[Callable[[Dict, str, Optional[Dict]], None]] = None,
+        index: Optional[SummaryIndex] = None,
+        folder_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+        store: Optional[ParsedStore] = None,
+        on_token: Optional[Callable[[Dict, str], None]] = None,
+        dedup: bool = True,
+    ):
+        self.drive = drive
+        self.download_concurrency = download_concurrency or DOWNLOAD_CONCURRENCY
+        # Parse concurrency cannot exceed the size of the shared process pool.
+        self.parse_workers = min(parse_workers or PARSE_WORKERS, PARSE_WORKERS)
+        self.summarize_concurrency = summarize_concurrency or SUMMARIZE_CONCURRENCY
+        cpus = os.cpu_count() or 1
+        self.pdf_page_workers = PDF_PIPELINE_PAGE_WORKERS or (
+            max(2, cpus // self.parse_workers) if cpus > 1 else 1
+        )
+        self.summarize = summarize
+        self.cache = cache if summarize else None
+        self.on_token = on_token if summarize else None
+        self.batch_small_files = summarize and batch_small_files and self.on_token is None
+        self.on_progress = on_progress
+        self.index = index if summarize else None
+        self.folder_id = folder_id
+        self.job_id = job_id
+        self.store = store
+        self.dedup = DuplicateDetector() if summarize and dedup else None
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.dedup_stats = {"exact": 0, "near": 0}
+        self.stage_seconds: Dict[str, float] = {}
+        # Files written for each Drive file id, and ids whose processing failed.
+        self.outputs: Dict[str, List[str]] = {}
+        self.failed = set()
+        # Files incremental runs found removed from their folder ({"id", "name", "folderId"}).
+        self.removed: List[Dict] = []
+        # Finished canonical files by id, and the duplicates waiting on unfinished ones.
+        self._finished: Dict[str, tuple] = {}
+        self._waiting: Dict[str, List[tuple]] = {}
+        self._duplicate_tasks: List[asyncio.Task] = []
+
+    async def run(self, files: List[Dict]) -> List[Dict]:
+        """Process all files and return one result per file, in listing order."""
+        results: List[Optional[Dict]] = [None] * len(files)
+
+        download_queue: asyncio.Queue = asyncio.Queue()
+        parse_queue: asyncio.Queue = asyncio.Queue(maxsize=self.parse_workers * 2)
+        summarize_queue: asyncio.Queue = asyncio.Queue(maxsize=self.summarize_concurrency * 2)
+        pending = list(enumerate(files))
+        if self.cache is not None:
+            pending = await asyncio.to_thread(self._serve_from_cache, pending, results)
+            missed = {index for index, _ in pending}
+            for index, f in enumerate(files):
+                if index not in missed:
+                    if self.on_token is not None:
+                        # Like reused duplicates, a cached summary is streamed as one token.
+                        self._emit_token(f, results[index]["summary"])
+                    self._emit(f, "cached", results[index])
+        for index, f in pending:
+            download_queue.put_nowait((index, f))
+
+        download_pool = ThreadPoolExecutor(
+            max_workers=self.download_concurrency, thread_name_prefix="drive-download"
+        )
+        llm_pool = ThreadPoolExecutor(
+            max_workers=self.summarize_concurrency, thread_name_prefix="llm-summarize"
+        )
+
+        downloaders = [
+            asyncio.create_task(self._download_worker(download_queue, parse_queue, download_pool, results))
+            for _ in range(self.download_concurrency)
+        ]
+        parsers = [
+            asyncio.create_task(self._parse_worker(parse_queue, summarize_queue, results))
+            for _ in range(self.parse_workers)
+        ]
+        batch_queue: asyncio.Queue = asyncio.Queue()
+        summarizers = [
+            asyncio.create_task(self._summarize_worker(summarize_queue, batch_queue, llm_pool, results))
+            for _ in range(self.summarize_concurrency)
+        ]
+        batcher = asyncio.create_task(self._batch_worker(batch_queue, llm_pool, results))
+
+        async def shut_down():
+            # Shut the stages down in order: each one drains before the next gets its sentinels.
+            await asyncio.gather(*downloaders)
+            for _ in parsers:
+                await parse_queue.put(_SENTINEL)
+            await asyncio.gather(*parsers)
+            for _ in summarizers:
+                await summarize_queue.put(_SENTINEL)
+            await asyncio.gather(*summarizers)
+            await batch_queue.put(_SENTINEL)
+            await batcher
+            # Every canonical file has finished by now, so all duplicates are scheduled.
+            await asyncio.gather(*self._duplicate_tasks)
+
+        workers = downloaders + parsers + summarizers + [batcher]
+        shutdown = asyncio.create_task(shut_down())
+        supervisor = asyncio.create_task(self._supervise(workers))
+        try:
+            done, _ = await asyncio.wait({shutdown, supervisor}, return_when=asyncio.FIRST_COMPLETED)
+            if supervisor in done:
+                # Raises if a stage worker died; its queue would otherwise never drain.
+                supervisor.result()
+            await shutdown
+        finally:
+            for task in workers + self._duplicate_tasks + [shutdown, supervisor]:
+                task.cancel()
+            download_pool.shutdown(wait=False, cancel_futures=True)
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    @staticmethod
+    async def _supervise(workers: List[asyncio.Task]):
+        """Returns once every stage worker has finished, raising the error of the first one that fails."""
+        pending = set(workers)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+
+    async def run_incremental(self, files: List[Dict], manifest: FolderManifest):
+        """
+        Processes only added or changed files, removes outputs of files that are no longer
+        listed, and returns (results for every listed file in listing order, change counts).
+        """
+        [(results, stats)] = await self.run_folders([(self.folder_id, files, manifest)])
+        return results, stats
+
+    async def run_folders(
+        self,
+        folders: List[Tuple[Optional[str], List[Dict], Optional[FolderManifest]]],
+        weights: Optional[List[int]] = None,
+    ) -> List[Tuple[List[Dict], Optional[Dict]]]:
+        """
+        Processes (folder id, files, manifest) groups as one run, scheduling their files
+        with interleave(weights). Folders with a manifest are processed incrementally.
+        A file listed in several folders is processed once. Returns one (results in
+        listing order, change counts or None) pair per folder.
+        """
+        deltas, prepared = [], []
+        for folder_id, files, manifest in folders:
+            files = [dict(f, folderId=folder_id) if folder_id else f for f in files]
+            if manifest is None:
+                delta, stats = files, None
+            else:
+                delta, stats = await self._prepare_incremental(files, manifest)
+            deltas.append(delta)
+            prepared.append((files, manifest, delta, stats))
+
+        scheduled, seen = [], set()
+        for f in interleave(deltas, weights):
+            if f["id"] not in seen:
+                seen.add(f["id"])
+                scheduled.append(f)
+        finished = dict(zip((f["id"] for f in scheduled), await self.run(scheduled)))
+
+        outcomes = []
+        for files, manifest, delta, stats in prepared:
+            if manifest is None:
+                outcomes.append(([finished[f["id"]] for f in files], None))
+                continue
+            for f in delta:
+                # Failed files stay out of the manifest so the next run retries them.
+                if f["id"] not in self.failed:
+                    manifest.record(f, self.outputs.get(f["id"], []), finished[f["id"]])
+            await asyncio.to_thread(manifest.save)
+            results = [
+                finished[f["id"]] if f["id"] in finished else manifest.entries[f["id"]]["result"]
+                for f in files
+            ]
+            outcomes.append((results, stats))
+        return outcomes
+
+    async def _prepare_incremental(self, files: List[Dict], manifest: FolderManifest):
+        """Drops outputs of removed and changed files and returns (files to process, change counts)."""
+        manifest.settings = self._settings_fingerprint()
+        added, changed, removed = manifest.diff(files)
+        self.removed.extend(
+            {"id": file_id, "name": manifest.entries[file_id].get("name", file_id), "folderId": manifest.folder_id}
+            for file_id in removed
+        )
+        # Outputs of changed files are dropped too, in case the file was renamed.
+        for file_id in removed + [f["id"] for f in changed]:
+            owned_elsewhere = partial(self._summary_owned_elsewhere, file_id)
+            for path in await asyncio.to_thread(manifest.discard, file_id, owned_elsewhere):
+                if self.index is not None and path.endswith("_summary.txt"):
+                    await asyncio.to_thread(self.index.remove, os.path.basename(path), file_id)
+        if self.store is not None:
+            for file_id in removed:
+                await asyncio.to_thread(self.store.remove, file_id)
+
+        delta = added + changed
+        stats = {
+            "added": len(added),
+            "changed": len(changed),
+            "unchanged": len(files) - len(delta),
+            "removed": len(removed),
+        }
+        return delta, stats
+
+    def _summary_owned_elsewhere(self, file_id: str, path: str) -> bool:
+        """Whether the index says another Drive file has written this summary since."""
+        if self.index is None or not path.endswith("_summary.txt"):
+            return False
+        owner = self.index.owner(os.path.basename(path))
+        return owner is not None and owner != file_id
+
+    # --- Stage workers ---
+
+    async def _download_worker(self, download_queue, parse_queue, pool, results):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                index, f = download_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            name = f["name"]
+            self._emit(f, "downloading")
+            try:
+                # Content stays in memory (or a temp file for very large files) until parsed.
+                with timed("download", self.stage_seconds):
+                    buffer = await loop.run_in_executor(pool, self._download, f)
+                DOWNLOADED_BYTES.inc(buffer.size)
+            except Exception as e:
+                print(f"Download error for {name}: {e}")
+                ERRORS.labels("download").inc()
+                self.failed.add(f["id"])
+                results[index] = self._error_result(f, f"Error downloading '{name}': {e}")
+                self._emit_result(f, results[index])
+                continue
+
+            await parse_queue.put((index, f, buffer))
+
+    async def _parse_worker(self, parse_queue, summarize_queue, results):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await parse_queue.get()
+            if item is _SENTINEL:
+                return
+
+            index, f, buffer = item
+            name = f["name"]
+            mime = f.get("mimeType")
+            self._emit(f, "parsing")
+            fmt = os.path.splitext(name)[1].lower().lstrip(".") or "unknown"
+            fp = None
+            try:
+                with timed("extract", self.stage_seconds):
+                    text, pages, seconds, fp = await loop.run_in_executor(
+                        get_parse_pool(),
+                        partial(
+                            _extract_with_stats,
+                            buffer.source(),
+                            mime,
+                            name,
+                            self.pdf_page_workers,
+                            self.dedup is not None,
+                        ),
+                    )
+                EXTRACT_SECONDS.labels(fmt, page_bucket(pages)).observe(seconds)
+                EXTRACTED_CHARS.labels(fmt).inc(len(text))
+                # extract_text reports format-level failures as "(Error ...)" text.
+                if text.startswith("(Error"):
+                    ERRORS.labels("extract").inc()
+            except Exception as e:
+                print(f"Extraction error for {name}: {e}")
+                ERRORS.labels("extract").inc()
+                text = f"(Error extracting text: {e})"
+            finally:
+                buffer.close()
+
+            if self.summarize:
+                try:
+                    await asyncio.to_thread(self._store_text, f, text)
+                except Exception as e:
+                    results[index] = self._failed_result(f, "storing text", e)
+                    self._emit_result(f, results[index])
+                    continue
+                match = self.dedup.add(f["id"], fp) if self.dedup is not None else None
+                if match is not None:
+                    self._defer_duplicate(index, f, text, match, results)
+                    continue
+                await summarize_queue.put((index, f, text))
+            else:
+                try:
+                    results[index] = await asyncio.to_thread(self._save_parse_record, f, text)
+                except Exception as e:
+                    results[index] = self._failed_result(f, "storing text", e)
+                self._emit_result(f, results[index])
+
+    async def _summarize_worker(self, summarize_queue, batch_queue, pool, results):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await summarize_queue.get()
+            if item is _SENTINEL:
+                return
+
+            index, f, text = item
+            if self.batch_small_files and is_small_document(text):
+                await batch_queue.put(item)
+                continue
+
+            self._emit(f, "summarizing")
+            on_token = None
+            if self.on_token is not None:
+                # Tokens arrive on the LLM thread; hand them to the event loop in order.
+                on_token = partial(loop.call_soon_threadsafe, self._emit_token, f)
+            try:
+                with timed("summarize", self.stage_seconds):
+                    summary_obj = await loop.run_in_executor(
+                        pool, partial(summarize_document, f["name"], text, on_token=on_token)
+                    )
+            except Exception as e:
+                print(f"Summarization error for {f['name']}: {e}")
+                summary_obj = {"summary": f"Error generating summary for '{f['name']}': {e}", "error": str(e)}
+            try:
+                results[index] = await asyncio.to_thread(self._finish_summary, f, text, summary_obj)
+            except Exception as e:
+                results[index] = self._failed_result(f, "saving summary", e)
+            self._emit_result(f, results[index])
+
+    async def _batch_worker(self, batch_queue, pool, results):
+        """Collects small documents and sends them in packed batches once full or idle for BATCH_LINGER_SECONDS."""
+        pending, tokens, in_flight = [], 0, []
+        while True:
+            try:
+                item = await asyncio.wait_for(batch_queue.get(), BATCH_LINGER_SECONDS if pending else None)
+            except asyncio.TimeoutError:
+                item = _FLUSH
+
+            if item is not _SENTINEL and item is not _FLUSH:
+                pending.append(item)
+                tokens += estimate_tokens(item[2])
+                if tokens < BATCH_TOKEN_BUDGET and len(pending) < BATCH_MAX_DOCS:
+                    continue
+
+            if pending:
+                in_flight.append(asyncio.create_task(self._flush_batch(pending, pool, results)))
+                pending, tokens = [], 0
+            if item is _SENTINEL:
+                await asyncio.gather(*in_flight)
+                return
+
+    async def _flush_batch(self, items, pool, results):
+        for _, f, _ in items:
+            self._emit(f, "summarizing")
+        loop = asyncio.get_running_loop()
+        with timed("summarize", self.stage_seconds):
+            finished = await loop.run_in_executor(pool, self._summarize_batch, items)
+        for (index, f, _), result in zip(items, finished):
+            results[index] = result
+            self._emit_result(f, result)
+
+    def _download(self, f: Dict):
+        # Waiting for a slot happens on the download thread, not the event loop.
+        with download_slots.slot():
+            return self.drive.download_to_buffer(
+                f["id"],
+                suffix=os.path.splitext(f["name"])[1],
+                export_mime_type=f.get("exportMimeType"),
+            )
+
+    # --- Duplicates ---
+
+    def _defer_duplicate(self, index: int, f: Dict, text: str, match, results):
+        """Reuses the canonical file's summary now if it is finished, else once it is."""
+        canonical_id, kind = match
+        self.dedup_stats[kind] += 1
+        DUPLICATES.labels(kind).inc()
+        item = (index, f, text)
+        if canonical_id in self._finished:
+            self._schedule_duplicate(item, *self._finished[canonical_id], results)
+        else:
+            self._waiting.setdefault(canonical_id, []).append((item, results))
+
+    def _schedule_duplicate(self, item, canonical: Dict, canonical_result: Dict, results):
+        self._duplicate_tasks.append(
+            asyncio.create_task(self._finish_duplicate(item, canonical, canonical_result, results))
+        )
+
+    async def _finish_duplicate(self, item, canonical: Dict, canonical_result: Dict, results):
+        index, f, _ = item
+        try:
+            result = await asyncio.to_thread(self._reuse_summary, f, canonical, canonical_result)
+        except Exception as e:
+            result = self._failed_result(f, "saving summary", e)
+        if self.on_token is not None:
+            self._emit_token(f, result["summary"])
+        results[index] = result
+        self._emit_result(f, result)
+
+    def _reuse_summary(self, f: Dict, canonical: Dict, canonical_result: Dict) -> Dict:
+        """
+        Saves the canonical file's summary for a duplicate and returns the duplicate's result.
+        Reused summaries are not cached under the duplicate's checksum: a later run finds
+        the duplicate again (or, with dedup off, summarizes it in its own right).
+        """
+        summary = canonical_result["summary"]
+        self._store_summary(f, summary)
+        if canonical["id"] in self.failed:
+            self.failed.add(f["id"])
+        return {"file_name": f["name"], "summary": summary, "duplicate_of": canonical["name"]}
+
+    # --- Result helpers ---
+
+    def _emit(self, f: Dict, stage: str, result: Optional[Dict] = None):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(f, stage, result)
+        except Exception as e:
+            # A broken listener must not stop the run.
+            print(f"Progress callback error for {f['name']}: {e}")
+
+    def _emit_token(self, f: Dict, token: str):
+        try:
+            self.on_token(f, token)
+        except Exception as e:
+            print(f"Token callback error for {f['name']}: {e}")
+
+    def _emit_result(self, f: Dict, result: Dict):
+        self._emit(f, "failed" if f["id"] in self.failed else "done", result)
+        if self.dedup is not None:
+            self._finished[f["id"]] = (f, result)
+            for item, results in self._waiting.pop(f["id"], []):
+                self._schedule_duplicate(item, f, result, results)
+
+    def _add_output(self, f: Dict, path: str):
+        self.outputs.setdefault(f["id"], []).append(path)
+
+    def _store_text(self, f: Dict, text: str):
+        if self.store is not None:
+            self.store.put(
+                f["id"],
+                f["name"],
+                text,
+                mime_type=f.get("mimeType"),
+                folder_id=f.get("folderId", self.folder_id),
+                md5_checksum=f.get("md5Checksum"),
+            )
+
+    def _store_summary(self, f: Dict, summary: str):
+        path = _save_summary(f, summary)
+        self._add_output(f, path)
+        if self.index is not None:
+            # The path tells same-named files from different subfolders apart in the view.
+            self.index.upsert(
+                os.path.basename(path),
+                os.path.splitext(f.get("path") or f["name"])[0],
+                summary,
+                file_id=f["id"],
+                folder_id=f.get("folderId", self.folder_id),
+                job_id=self.job_id,
+            )
+
+    def _settings_fingerprint(self) -> str:
+        """Short hash of the settings the run's outputs depend on, recorded in manifests."""
+        settings = summary_settings() if self.summarize else extraction_settings()
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def _cache_key(self, f: Dict) -> Optional[str]:
+        return make_cache_key(f.get("md5Checksum"), summary_settings())
+
+    def _serve_from_cache(self, pending, results):
+        """Fills results for cached files and returns the (index, file) pairs still to process."""
+        misses = []
+        for index, f in pending:
+            cached = self.cache.get(self._cache_key(f))
+            if cached is None:
+                misses.append((index, f))
+                continue
+            self._store_text(f, cached["text"])
+            self._store_summary(f, cached["summary"])
+            results[index] = {"file_name": f["name"], "summary": cached["summary"]}
+            if self.dedup is not None:
+                # Cached files can be canonical for duplicates found later in the run.
+                self.dedup.add(f["id"], fingerprint(cached["text"]))
+                self._finished[f["id"]] = (f, results[index])
+        self.cache_stats["hits"] += len(pending) - len(misses)
+        self.cache_stats["misses"] += len(misses)
+        CACHE_LOOKUPS.labels("hit").inc(len(pending) - len(misses))
+        CACHE_LOOKUPS.labels("miss").inc(len(misses))
+        return misses
+
+    def _finish_summary(self, f: Dict, text: str, summary_obj: Dict) -> Dict:
+        """Saves a summary, caches it if it succeeded and returns the file's result."""
+        name = f["name"]
+        self._store_summary(f, summary_obj["summary"])
+        if "error" in summary_obj:
+            ERRORS.labels("summarize").inc()
+            self.failed.add(f["id"])
+        elif self.cache is not None:
+            # Only successful summaries are cached, so failed calls are retried on the next run.
+            self.cache.put(self._cache_key(f), name, text, summary_obj["summary"])
+        result = {"file_name": name, "summary": summary_obj["summary"]}
+        if "coverage" in summary_obj:
+            result["coverage"] = summary_obj["coverage"]
+        return result
+
+    def _summarize_batch(self, items) -> List[Dict]:
+        docs = [{"id": f["id"], "file_name": f["name"], "text": text} for _, f, text in items]
+        try:
+            summaries = summarize_batch(docs)
+        except Exception as e:
+            print(f"Batched summarization error: {e}")
+            summaries = {}
+        finished = []
+        for _, f, text in items:
+            summary_obj = summaries.get(f["id"]) or {
+                "summary": f"Error generating summary for '{f['name']}': no result from batched request",
+                "error": "missing batch result",
+            }
+            try:
+                finished.append(self._finish_summary(f, text, summary_obj))
+            except Exception as e:
+                finished.append(self._failed_result(f, "saving summary", e))
+        return finished
+
+    def _save_parse_record(self, f: Dict, text: str) -> Dict:
+        name = f["name"]
+        preview = text[:1000] + "..." if len(text) > 1000 else text
+        file_info = {
+            "file_name": name,
+            "mime_type": f.get("mimeType"),
+            "chars": len(text),
+            "preview": preview
+        }
+        self._store_text(f, text)
+        return file_info
+
+    def _failed_result(self, f: Dict, action: str, error: Exception) -> Dict:
+        """Marks a file failed after an error storing its outputs (e.g. a locked database) and returns its result."""
+        print(f"Error {action} for {f['name']}: {error}")
+        ERRORS.labels("store").inc()
+        self.failed.add(f["id"])
+        return self._error_result(f, f"Error {action} for '{f['name']}': {error}")
+
+    def _error_result(self, f: Dict, message: str) -> Dict:
+        if self.summarize:
+            return {"file_name": f["name"], "summary": message}
+        return {
+            "file_name": f["name"],
+            "mime_type": f.get("mimeType"),
+            "chars": 0,
+            "preview": message
+        }
@@ -0,0 +1,267 @@
+# rate_utils.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# HTTP statuses worth retrying; 429 (and Drive's 403 rate-limit reasons) also count as throttling.
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+THROTTLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # openai.APIStatusError exposes status_code; googleapiclient's HttpError exposes resp.status.
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "resp", None) is not None:
+        status = getattr(exc.resp, "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle(exc: BaseException) -> bool:
+    status = _status_code(exc)
+    if status == 429:
+        return True
+    return status == 403 and any(reason in str(exc) for reason in THROTTLE_REASONS)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Throttling, server errors, timeouts and dropped connections are retried; other errors are not."""
+    if is_throttle(exc):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    name = type(exc).__name__
+    return isinstance(exc, (ConnectionError, TimeoutError)) or name in (
+        "APIConnectionError",
+        "APITimeoutError",
+        "ServerNotFoundError",
+        "HttpLib2Error",
+    )
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Reads a Retry-After header (seconds form) from an OpenAI or Google API error."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or getattr(exc, "resp", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket: at most `rate` calls per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Holds back every caller for `seconds`, e.g. when the backend sends Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by about one slot per limit's worth of successful
+    calls and halves on throttling, never leaving [minimum, maximum].
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, decrease_factor: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class InFlightLimit:
+    """
+    Process-wide cap on whole operations of one kind (a full download, an LLM request
+    including its streamed reply), shared by every run and batch. RateController limits
+    individual API calls; this bounds the work in progress across all of them.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self.in_flight, "peak": self.peak}
+
+
+class RateController:
+    """
+    Shared rate control for one backend: token-bucket rate limit, adaptive concurrency
+    and retries with jittered exponential backoff that honour Retry-After.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        initial_concurrency: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_attempts = max_attempts
+        self._backoff = wait_random_exponential(multiplier=RETRY_BASE_DELAY, max=RETRY_MAX_DELAY)
+        self._counters_lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _count(self, key: str):
+        with self._counters_lock:
+            self.counters[key] += 1
+
+    def _wait(self, retry_state) -> float:
+        exc = retry_state.outcome.exception()
+        retry_after = retry_after_seconds(exc) if exc is not None else None
+        if retry_after is not None:
+            return min(retry_after, RETRY_MAX_DELAY)
+        return self._backoff(retry_state)
+
+    def _before_sleep(self, retry_state):
+        self._count("retries")
+        print(f"{self.name}: retrying after {retry_state.outcome.exception()!r} (attempt {retry_state.attempt_number})")
+
+    def _call_once(self, fn: Callable, *args, **kwargs):
+        self.bucket.acquire()
+        self.limiter.acquire()
+        self._count("calls")
+        throttled = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttle(e)
+            if throttled:
+                self._count("throttled")
+                retry_after = retry_after_seconds(e)
+                if retry_after:
+                    self.bucket.pause(min(retry_after, RETRY_MAX_DELAY))
+            raise
+        finally:
+            self.limiter.release(throttled=throttled)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Calls fn under this backend's limits, retrying retryable failures."""
+        retrying = Retrying(
+            retry=retry_if_exception(is_retryable),
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self._wait,
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+        try:
+            return retrying(self._call_once, fn, *args, **kwargs)
+        except Exception:
+            self._count("failures")
+            raise
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
+
+
+# One controller per backend, shared by every caller in the process.
+drive_rate = RateController(
+    "drive",
+    rate=float(os.getenv("DRIVE_RATE_PER_SEC", "20")),
+    burst=float(os.getenv("DRIVE_RATE_BURST", "40")),
+    initial_concurrency=int(os.getenv("DRIVE_INITIAL_CONCURRENCY", "8")),
+    max_concurrency=int(os.getenv("DRIVE_MAX_CONCURRENCY", "32")),
+)
+llm_rate = RateController(
+    "llm",
+    rate=float(os.getenv("LLM_RATE_PER_SEC", "8")),
+    burst=float(os.getenv("LLM_RATE_BURST", "16")),
+    initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "8")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+)
+
+
+download_slots = InFlightLimit("download", int(os.getenv("MAX_INFLIGHT_DOWNLOADS", "16")))
+llm_slots = InFlightLimit("llm", int(os.getenv("MAX_INFLIGHT_LLM_REQUESTS", "16")))
+
+
+def rate_stats() -> Dict[str, Dict]:
+    return {
+        "drive": drive_rate.stats(),
+        "llm": llm_rate.stats(),
+        "in_flight": {"downloads": download_slots.stats(), "llm_requests": llm_slots.stats()},
+    }
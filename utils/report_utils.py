@@ -0,0 +1,310 @@
+# report_utils.py
+import csv
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from utils.metrics_utils import timed
+
+REPORTS_DIR = "reports"
+# Every run gets reports/runs/<run id>.csv; every folder reports/folders/<folder id>.csv.
+RUN_SCOPE = "runs"
+FOLDER_SCOPE = "folders"
+# Run reports kept; the oldest (CSV and PDF) are deleted as new runs start. 0 keeps all.
+RUN_REPORT_RETENTION = int(os.getenv("RUN_REPORT_RETENTION", "200"))
+# Id of the run whose report was written to last, so the summaries view need not scan runs/.
+LATEST_RUN_PATH = os.path.join(REPORTS_DIR, "latest_run.txt")
+REPORT_COLUMNS = [
+    "file_name",
+    "summary",
+    "duplicate_of",
+    "status",
+    "file_id",
+    "path",
+    "folder_id",
+    "run_id",
+    "finished_at",
+]
+
+# Run and Drive folder ids are used as file names, so anything else is rejected.
+_REPORT_KEY = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+_render_locks: Dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+# Report rows are appended by one background thread, in the order they were recorded,
+# so recording a finished file never blocks the event loop on file I/O.
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+# Run id last written to LATEST_RUN_PATH by this process (only used on the writer thread).
+_latest_run: Optional[str] = None
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-writer")
+        return _writer
+
+
+def valid_report_key(key: Optional[str]) -> bool:
+    return bool(key) and bool(_REPORT_KEY.match(key))
+
+
+def report_path(scope: str, key: str, extension: str = ".csv") -> str:
+    return os.path.join(REPORTS_DIR, scope, f"{key}{extension}")
+
+
+def _encode_rows(rows: List[List[str]]) -> bytes:
+    out = io.StringIO()
+    csv.writer(out).writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def _create_report(path: str):
+    """
+    Creates the CSV with its header unless it exists. The header is written to a temp
+    file that is then linked into place, so a racing writer never sees a headerless file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        # The BOM lets Excel detect UTF-8, like the utf-8-sig reports before.
+        f.write(b"\xef\xbb\xbf" + _encode_rows([REPORT_COLUMNS]))
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp_path)
+
+
+def append_rows(path: str, rows: List[Dict]):
+    """
+    Appends rows to a CSV report, creating it first if needed. Each call is a single
+    write on an O_APPEND descriptor, so concurrent runs (and processes) appending to the
+    same report never interleave within a row.
+    """
+    if not os.path.exists(path):
+        _create_report(path)
+    data = _encode_rows([[str(row.get(column) or "") for column in REPORT_COLUMNS] for row in rows])
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def read_rows(path: str) -> List[Dict]:
+    """
+    Rows of a CSV report, keeping only the latest row for each file, in order of first
+    appearance. Files whose latest row is a "removed" marker are left out.
+    """
+    latest: Dict[str, Dict] = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            latest[row.get("file_id") or row.get("file_name")] = row
+    return [row for row in latest.values() if row.get("status") != "removed"]
+
+
+class RunReports:
+    """
+    Incremental reports for one summarize run: each finished file is appended to the
+    run's CSV and to its folder's CSV as soon as its summary exists, so report cost grows
+    with new summaries only. PDFs are rendered from the CSVs on first download (ensure_pdf).
+
+    A folder's CSV accumulates rows over runs; the latest row for a file supersedes earlier ones.
+    Files of multi-folder runs go to the report of their own "folderId".
+
+    record() only queues the row; the writes happen on the report writer thread and their
+    time is added to timings["report"]. wait() returns once every queued row is written.
+    """
+
+    def __init__(self, run_id: str, folder_id: Optional[str] = None, timings: Optional[Dict[str, float]] = None):
+        self.run_id = run_id
+        self.folder_id = folder_id
+        self.timings = timings
+        self.recorded = set()
+        self._pending: List[Future] = []
+
+    def record(self, f: Dict, status: str, result: Dict):
+        folder_id = f.get("folderId") or self.folder_id
+        paths = [report_path(RUN_SCOPE, self.run_id)]
+        if valid_report_key(folder_id):
+            paths.append(report_path(FOLDER_SCOPE, folder_id))
+        row = {
+            "file_name": result.get("file_name", f["name"]),
+            "summary": result.get("summary"),
+            "duplicate_of": result.get("duplicate_of"),
+            "status": status,
+            "file_id": f["id"],
+            "path": f.get("path"),
+            "folder_id": folder_id,
+            "run_id": self.run_id,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        self.recorded.add(f["id"])
+        self._pending.append(_get_writer().submit(self._write, paths, row))
+
+    def record_removed(self, f: Dict):
+        """
+        Marks a file an incremental run found deleted from its folder, so the folder
+        report (through read_rows) stops listing it. Run reports only list files of the run.
+        """
+        folder_id = f.get("folderId") or self.folder_id
+        if not valid_report_key(folder_id):
+            return
+        row = {
+            "file_name": f["name"],
+            "status": "removed",
+            "file_id": f["id"],
+            "folder_id": folder_id,
+            "run_id": self.run_id,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        path = report_path(FOLDER_SCOPE, folder_id)
+        self._pending.append(_get_writer().submit(self._write_folder_row, path, row))
+
+    def _write_folder_row(self, path: str, row: Dict):
+        with timed("report", self.timings):
+            append_rows(path, [row])
+
+    def _write(self, paths: List[str], row: Dict):
+        global _latest_run
+        with timed("report", self.timings):
+            if not os.path.exists(paths[0]):
+                # First row of this run: make room by dropping the oldest run reports.
+                _prune_runs(self.run_id)
+            for path in paths:
+                append_rows(path, [row])
+            if _latest_run != self.run_id:
+                _write_latest_run(self.run_id)
+                _latest_run = self.run_id
+
+    def wait(self):
+        """Blocks until every recorded row has been written."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error writing report row for run {self.run_id}: {e}")
+
+    def links(self, folder_id: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+        links = {"run": {ext: f"/runs/{self.run_id}/report.{ext}" for ext in ("csv", "pdf")}}
+        folder_id = folder_id or self.folder_id
+        if valid_report_key(folder_id):
+            links["folder"] = {ext: f"/folders/{folder_id}/report.{ext}" for ext in ("csv", "pdf")}
+        return links
+
+
+def _render_lock(path: str) -> threading.Lock:
+    with _render_locks_guard:
+        return _render_locks.setdefault(path, threading.Lock())
+
+
+def _pdf_text(text: str) -> str:
+    # FPDF's core fonts only cover Latin-1.
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _render_pdf(rows: List[Dict], title: str, pdf_path: str):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, _pdf_text(title), ln=True, align="C")
+    pdf.ln(10)
+
+    pdf.set_font("Arial", "", 12)
+    for row in rows:
+        pdf.multi_cell(0, 6, _pdf_text(f"File: {row.get('path') or row['file_name']}"))
+        if row.get("duplicate_of"):
+            pdf.multi_cell(0, 6, _pdf_text(f"Duplicate of: {row['duplicate_of']}"))
+        pdf.multi_cell(0, 6, _pdf_text(f"Summary: {row['summary']}"))
+        pdf.ln(5)
+    pdf.output(pdf_path)
+
+
+def ensure_pdf(csv_path: str, title: str = "Document Summaries") -> str:
+    """
+    Returns the PDF version of a CSV report, rendering it only when it is missing or the
+    CSV has changed since. The PDF's mtime is set to that of the CSV it was rendered from,
+    which is how staleness is detected, also across processes.
+    """
+    pdf_path = os.path.splitext(csv_path)[0] + ".pdf"
+    with _render_lock(pdf_path):
+        source = os.stat(csv_path)
+        if os.path.exists(pdf_path) and os.stat(pdf_path).st_mtime_ns == source.st_mtime_ns:
+            return pdf_path
+        temp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with timed("report"):
+                _render_pdf(read_rows(csv_path), title, temp_path)
+            os.utime(temp_path, ns=(source.st_mtime_ns, source.st_mtime_ns))
+            os.replace(temp_path, pdf_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return pdf_path
+
+
+def read_snapshot(path: str) -> Tuple[bytes, str, float]:
+    """
+    Returns (content, ETag, mtime) of a report. CSVs may be appended to while they are
+    read, so the content is cut at the size the ETag was computed from.
+    """
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read(stat.st_size)
+    etag = '"' + hashlib.sha1(f"{stat.st_mtime_ns}-{len(data)}".encode("utf-8")).hexdigest() + '"'
+    return data, etag, stat.st_mtime
+
+
+def _write_latest_run(run_id: str):
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    temp_path = f"{LATEST_RUN_PATH}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(run_id)
+    os.replace(temp_path, LATEST_RUN_PATH)
+
+
+def _prune_runs(current_run: str):
+    """Deletes the oldest run reports so at most RUN_REPORT_RETENTION remain once current_run starts."""
+    runs_dir = os.path.join(REPORTS_DIR, RUN_SCOPE)
+    if not RUN_REPORT_RETENTION or not os.path.isdir(runs_dir):
+        return
+    reports = [
+        entry for entry in os.scandir(runs_dir)
+        if entry.name.endswith(".csv") and entry.name != f"{current_run}.csv"
+    ]
+    excess = len(reports) - (RUN_REPORT_RETENTION - 1)
+    if excess <= 0:
+        return
+    for entry in sorted(reports, key=lambda entry: entry.stat().st_mtime)[:excess]:
+        for path in (entry.path, os.path.splitext(entry.path)[0] + ".pdf"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def latest_run_report() -> Optional[str]:
+    """Id of the run whose report was written to last, if its report still exists."""
+    try:
+        with open(LATEST_RUN_PATH, "r", encoding="utf-8") as f:
+            run_id = f.read().strip()
+    except FileNotFoundError:
+        return None
+    if valid_report_key(run_id) and os.path.exists(report_path(RUN_SCOPE, run_id)):
+        return run_id
+    return None
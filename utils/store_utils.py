@@ -0,0 +1,196 @@
+# store_utils.py
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+PARSED_STORE_PATH = os.getenv("PARSED_STORE_PATH", os.path.join("parsed_outputs", "parsed.db"))
+PARSED_STORE_COMPRESSION_LEVEL = int(os.getenv("PARSED_STORE_COMPRESSION_LEVEL", "6"))
+# Characters of context shown on each side of the first match in a search snippet.
+SNIPPET_CONTEXT_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "80"))
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), PARSED_STORE_COMPRESSION_LEVEL)
+
+
+def _decompress(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def search_terms(query: str) -> List[str]:
+    """Splits a free-text query into the words that every match must contain."""
+    return _TERM_PATTERN.findall(query)
+
+
+def make_snippet(text: str, terms: List[str], context: int = SNIPPET_CONTEXT_CHARS) -> str:
+    """Returns the text around the first occurrence of any term, with the matches in [brackets]."""
+    if not terms:
+        return text[: context * 2]
+    pattern = re.compile("|".join(rf"\b{re.escape(term)}" for term in terms), re.IGNORECASE)
+    match = pattern.search(text)
+    if match is None:
+        return text[: context * 2]
+    start = max(0, match.start() - context)
+    stop = min(len(text), match.end() + context)
+    window = pattern.sub(lambda m: f"[{m.group(0)}]", text[start:stop])
+    window = " ".join(window.split())
+    return ("..." if start > 0 else "") + window + ("..." if stop < len(text) else "")
+
+
+class ParsedStore:
+    """
+    Single SQLite store for extracted document text and metadata.
+
+    Text is kept as a zlib-compressed blob, one row per Drive file, and indexed by a
+    contentless FTS5 table, so the index adds no second copy of the text. Snippets are
+    cut from the decompressed text of the matching rows only.
+    """
+
+    def __init__(self, path: str = PARSED_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                file_id TEXT NOT NULL UNIQUE,
+                file_name TEXT NOT NULL,
+                mime_type TEXT,
+                folder_id TEXT,
+                md5_checksum TEXT,
+                chars INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_folder ON documents (folder_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(file_name, text, content='');
+            """
+        )
+        self._conn.commit()
+
+    def _unindex(self, file_id: str):
+        # Contentless FTS5 rows are deleted by replaying the values that were indexed.
+        row = self._conn.execute(
+            "SELECT id, file_name, text FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        self._conn.execute(
+            "INSERT INTO documents_fts (documents_fts, rowid, file_name, text) VALUES ('delete', ?, ?, ?)",
+            (row[0], row[1], _decompress(row[2])),
+        )
+        self._conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+        return True
+
+    def put(
+        self,
+        file_id: str,
+        file_name: str,
+        text: str,
+        mime_type: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        md5_checksum: Optional[str] = None,
+    ):
+        """Stores (or replaces) the extracted text of one Drive file and indexes it."""
+        blob = _compress(text)
+        with self._lock:
+            if md5_checksum is not None:
+                current = self._conn.execute(
+                    "SELECT file_name, md5_checksum, folder_id FROM documents WHERE file_id = ?", (file_id,)
+                ).fetchone()
+                if current == (file_name, md5_checksum, folder_id):
+                    return
+            self._unindex(file_id)
+            cursor = self._conn.execute(
+                "INSERT INTO documents "
+                "(file_id, file_name, mime_type, folder_id, md5_checksum, chars, text, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_id, file_name, mime_type, folder_id, md5_checksum, len(text), blob, time.time()),
+            )
+            self._conn.execute(
+                "INSERT INTO documents_fts (rowid, file_name, text) VALUES (?, ?, ?)",
+                (cursor.lastrowid, file_name, text),
+            )
+            self._conn.commit()
+
+    def remove(self, file_id: str):
+        with self._lock:
+            self._unindex(file_id)
+            self._conn.commit()
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, file_name, mime_type, folder_id, chars, text, updated_at "
+                "FROM documents WHERE file_id = ?",
+                (file_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("file_id", "file_name", "mime_type", "folder_id", "chars", "text", "updated_at")
+        document = dict(zip(keys, row))
+        document["text"] = _decompress(document["text"])
+        return document
+
+    def search(self, query: str, limit: int = 20, folder_id: Optional[str] = None) -> List[Dict]:
+        """Returns the best matching documents for a free-text query, each with a snippet."""
+        terms = search_terms(query)
+        if not terms:
+            return []
+        # Quoting every word keeps user input from being read as FTS5 query syntax.
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        sql = (
+            "SELECT d.file_id, d.file_name, d.mime_type, d.folder_id, d.chars, d.text, documents_fts.rank "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params: List = [match]
+        if folder_id:
+            sql += " AND d.folder_id = ?"
+            params.append(folder_id)
+        sql += " ORDER BY documents_fts.rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        results = []
+        for file_id, file_name, mime_type, doc_folder_id, chars, blob, rank in rows:
+            results.append({
+                "file_id": file_id,
+                "file_name": file_name,
+                "mime_type": mime_type,
+                "folder_id": doc_folder_id,
+                "chars": chars,
+                "score": round(-rank, 4),
+                "snippet": make_snippet(_decompress(blob), terms),
+            })
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, chars, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chars), 0), COALESCE(SUM(LENGTH(text)), 0) FROM documents"
+            ).fetchone()
+        return {"documents": count, "chars": chars, "stored_bytes": stored}
+
+
+_parsed_store: Optional[ParsedStore] = None
+_parsed_store_lock = threading.Lock()
+
+
+def get_parsed_store() -> ParsedStore:
+    """Returns the process-wide parsed-output store, opening it on first use."""
+    global _parsed_store
+    with _parsed_store_lock:
+        if _parsed_store is None:
+            _parsed_store = ParsedStore()
+        return _parsed_store
@@ -1,6 +1,14 @@
 import os
-from openai import OpenAI
+import re
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv # Import load_dotenv
+from utils.metrics_utils import ERRORS, LLM_FIRST_TOKEN_SECONDS, record_llm_call
+from utils.parse_utils import extraction_settings
+from utils.rate_utils import llm_rate, llm_slots
 
 # Load environment variables
 load_dotenv()
@@ -8,41 +16,360 @@ load_dotenv()
 # Use your OpenRouter API key from environment variables
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-if not OPENROUTER_API_KEY:
-    raise ValueError("OPENROUTER_API_KEY environment variable not set. Please set it in your .env file.")
+# Any OpenAI-compatible endpoint works, e.g. the local stub used by the benchmarks.
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
-client = OpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1"
+# The client is built on first use: the openai package is slow to import, and the app
+# can start (and serve stored summaries) without an API key.
+_client = None
+_client_lock = threading.Lock()
+
+# Model and prompt settings. These also form part of the summary cache key, so
+# changing any of them invalidates previously cached summaries.
+MODEL = os.getenv("SUMMARY_MODEL", "openai/gpt-4o")  # or "openai/gpt-4o-mini" for faster/lighter responses
+SYSTEM_PROMPT = "You are a helpful assistant that summarizes documents concisely."
+USER_PROMPT_TEMPLATE = "Summarize the following document in 5-10 sentences, focusing on key information:\n\n{text}"
+# Truncate text to avoid exceeding model's context window ("truncate" mode only).
+# 5000 characters is a reasonable limit for a short summary,
+# but adjust based on the specific model and your needs.
+MAX_INPUT_CHARS = int(os.getenv("SUMMARY_MAX_INPUT_CHARS", "5000"))
+TEMPERATURE = 0.5 # Adjust creativity; lower for more factual, higher for more creative
+MAX_TOKENS = 400 # Max tokens for the summary itself
+
+# "map_reduce" summarizes the whole document in chunks and combines the partial summaries;
+# "truncate" summarizes only the first MAX_INPUT_CHARS characters.
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "map_reduce")
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+# Upper bound on document tokens sent to the map phase; longer documents are sampled evenly
+# and their summary says so (see SAMPLED_NOTE_TEMPLATE).
+DOC_TOKEN_BUDGET = int(os.getenv("SUMMARY_DOC_TOKEN_BUDGET", "60000"))
+# Concurrent chunk summaries across all documents in this process.
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
+MAP_MAX_TOKENS = 250
+MAP_PROMPT_TEMPLATE = "Summarize this section of a longer document in 3-5 sentences, keeping key facts, figures and names:\n\n{text}"
+REDUCE_PROMPT_TEMPLATE = "The following are summaries of consecutive sections of one document. Combine them into a single summary of the whole document in 5-10 sentences, focusing on key information:\n\n{text}"
+SAMPLED_NOTE_TEMPLATE = "\n\n(Summary based on {summarized} of {total} sections of this document; it exceeded the token budget.)"
+# Rough conversion used for token budgeting; avoids a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+
+# Batching: documents up to SMALL_DOC_TOKENS are packed into shared requests of at most
+# BATCH_TOKEN_BUDGET input tokens and BATCH_MAX_DOCS documents.
+SMALL_DOC_TOKENS = int(os.getenv("SUMMARY_SMALL_DOC_TOKENS", "1500"))
+BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "6000"))
+BATCH_MAX_DOCS = int(os.getenv("SUMMARY_BATCH_MAX_DOCS", "8"))
+BATCH_PROMPT_TEMPLATE = (
+    "Summarize each of the following documents separately in 5-10 sentences, focusing on key information. "
+    "Reply with only a JSON object that maps each document id to its summary, "
+    "for example {{\"<id>\": \"<summary>\"}}.\n\n{documents}"
 )
 
-def summarize_document(file_name: str, text: str) -> dict:
+_map_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_client():
+    """Returns the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not OPENROUTER_API_KEY:
+                    raise ValueError("OPENROUTER_API_KEY environment variable not set. Please set it in your .env file.")
+                from openai import OpenAI
+
+                _client = OpenAI(
+                    api_key=OPENROUTER_API_KEY,
+                    base_url=OPENROUTER_BASE_URL,
+                    max_retries=0 # Retries, backoff and throttling are handled by llm_rate
+                )
+    return _client
+
+
+def summary_settings() -> dict:
+    """Returns every setting that influences the generated summary (used for cache keys)."""
+    return {
+        # The summary can only be as complete as the extracted text.
+        **extraction_settings(),
+        "model": MODEL,
+        "system_prompt": SYSTEM_PROMPT,
+        "user_prompt": USER_PROMPT_TEMPLATE,
+        "max_input_chars": MAX_INPUT_CHARS,
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS,
+        "mode": SUMMARY_MODE,
+        "chunk_tokens": CHUNK_TOKENS,
+        "doc_token_budget": DOC_TOKEN_BUDGET,
+        "map_prompt": MAP_PROMPT_TEMPLATE,
+        "reduce_prompt": REDUCE_PROMPT_TEMPLATE,
+        "map_max_tokens": MAP_MAX_TOKENS,
+        "batch_prompt": BATCH_PROMPT_TEMPLATE,
+        "sampled_note": SAMPLED_NOTE_TEMPLATE,
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _split_oversized(piece: str, max_chars: int) -> List[str]:
+    """Splits a paragraph that exceeds max_chars at sentence boundaries, and hard-splits run-on sentences."""
+    parts = []
+    for sentence in re.split(r"(?<=[.!?])\s+", piece):
+        while len(sentence) > max_chars:
+            parts.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            parts.append(sentence)
+    return parts
+
+
+def split_into_chunks(text: str, chunk_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """Packs paragraphs (or sentences of long paragraphs) into chunks of at most chunk_tokens."""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks: List[str] = []
+    current: List[str] = []
+    current_len = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars)
+        for piece in pieces:
+            if current and current_len + len(piece) + 2 > max_chars:
+                chunks.append("\n\n".join(current))
+                current, current_len = [], 0
+            current.append(piece)
+            current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _within_budget(chunks: List[str], budget_tokens: int) -> List[str]:
+    """
+    Keeps evenly spaced chunks when a document exceeds the token budget, so the sample
+    spans the whole document. The chunks in between are not summarized.
+    """
+    total = sum(estimate_tokens(c) for c in chunks)
+    if total <= budget_tokens:
+        return chunks
+    keep = max(1, budget_tokens * len(chunks) // total)
+    step = len(chunks) / keep
+    return [chunks[int(i * step)] for i in range(keep)]
+
+
+def _get_map_pool() -> ThreadPoolExecutor:
+    global _map_pool
+    if _map_pool is None:
+        _map_pool = ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="llm-map")
+    return _map_pool
+
+
+def _consume_stream(stream, on_token: Callable[[str], None], start: float) -> Tuple[str, object]:
+    """Passes each text delta of a streamed completion to on_token and returns (full text, usage)."""
+    parts: List[str] = []
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            delta = choice.delta.content
+            if delta:
+                if not parts:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                parts.append(delta)
+                on_token(delta)
+    return "".join(parts), usage
+
+
+def _complete(
+    prompt: str,
+    max_tokens: int,
+    kind: str = "summary",
+    on_token: Optional[Callable[[str], None]] = None,
+    **kwargs
+) -> str:
+    """
+    Sends one chat completion; kind ("summary", "map", "reduce" or "batch") labels its metrics.
+    With on_token the completion is streamed and every text delta is passed to on_token as it arrives.
+    """
+    if on_token is not None:
+        kwargs.update(stream=True, stream_options={"include_usage": True})
+    # The slot is held until the reply (or stream) has been read completely.
+    with llm_slots.slot():
+        start = time.perf_counter()
+        try:
+            # Only opening the request is retried; once tokens have been sent they cannot be taken back.
+            response = llm_rate.call(
+                get_client().chat.completions.create,
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+            if on_token is not None:
+                content, usage = _consume_stream(response, on_token, start)
+            else:
+                content, usage = response.choices[0].message.content, getattr(response, "usage", None)
+        except Exception:
+            ERRORS.labels("llm").inc()
+            record_llm_call(kind, time.perf_counter() - start)
+            raise
+        record_llm_call(kind, time.perf_counter() - start, usage)
+    return content.strip()
+
+
+def _map_reduce(text: str, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, Optional[Dict]]:
+    """
+    Returns (summary, coverage). coverage is None when every chunk was summarized, else
+    {"sections_summarized", "sections_total"} for documents sampled to fit DOC_TOKEN_BUDGET.
+    """
+    # Only the call that writes the final summary is streamed; map and intermediate calls are not.
+    chunks = split_into_chunks(text)
+    if len(chunks) <= 1:
+        return _complete(USER_PROMPT_TEMPLATE.format(text=text), MAX_TOKENS, on_token=on_token), None
+
+    sampled = _within_budget(chunks, DOC_TOKEN_BUDGET)
+    coverage = None
+    if len(sampled) < len(chunks):
+        coverage = {"sections_summarized": len(sampled), "sections_total": len(chunks)}
+    chunks = sampled
+    pool = _get_map_pool()
+    partials = list(pool.map(lambda chunk: _complete(MAP_PROMPT_TEMPLATE.format(text=chunk), MAP_MAX_TOKENS, kind="map"), chunks))
+
+    # Reduce in rounds until the partial summaries fit into a single request.
+    while estimate_tokens("\n\n".join(partials)) > CHUNK_TOKENS:
+        groups = split_into_chunks("\n\n".join(partials))
+        if len(groups) >= len(partials):
+            break  # Partials are individually too large to group; reduce them as they are.
+        partials = list(pool.map(lambda group: _complete(REDUCE_PROMPT_TEMPLATE.format(text=group), MAP_MAX_TOKENS, kind="reduce"), groups))
+
+    summary = _complete(
+        REDUCE_PROMPT_TEMPLATE.format(text="\n\n".join(partials)), MAX_TOKENS, kind="reduce", on_token=on_token
+    )
+    if coverage is not None:
+        # The note is part of the summary, so reports, views and cached copies show it too.
+        note = SAMPLED_NOTE_TEMPLATE.format(summarized=coverage["sections_summarized"], total=coverage["sections_total"])
+        if on_token is not None:
+            on_token(note)
+        summary += note
+    return summary, coverage
+
+
+def summarize_document(
+    file_name: str,
+    text: str,
+    mode: Optional[str] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> dict:
     """
     Summarizes the given text using the OpenAI GPT model via OpenRouter.
+    In "map_reduce" mode (the default) long documents are split into token-budgeted
+    chunks that are summarized concurrently and then combined; "truncate" mode
+    summarizes only the first MAX_INPUT_CHARS characters.
+    With on_token the final summary is streamed, one text delta per call, as it is generated.
+    Documents over DOC_TOKEN_BUDGET are summarized from an even sample of their sections;
+    their result carries "coverage" and the summary ends with a note saying so.
     """
     if not text.strip():
         return {"file_name": file_name, "summary": "No readable text found for summarization."}
 
-    # Truncate text to avoid exceeding model's context window. 
-    # 5000 characters is a reasonable limit for a short summary, 
-    # but adjust based on the specific model and your needs.
-    text_to_summarize = text[:5000] 
-
+    coverage = None
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-4o",  # or "openai/gpt-4o-mini" for faster/lighter responses
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes documents concisely."},
-                {"role": "user", "content": f"Summarize the following document in 5-10 sentences, focusing on key information:\n\n{text_to_summarize}"}
-            ],
-            temperature=0.5, # Adjust creativity; lower for more factual, higher for more creative
-            max_tokens=400 # Max tokens for the summary itself
-        )
-
-        summary = response.choices[0].message.content.strip()
+        if (mode or SUMMARY_MODE) == "truncate":
+            summary = _complete(USER_PROMPT_TEMPLATE.format(text=text[:MAX_INPUT_CHARS]), MAX_TOKENS, on_token=on_token)
+        else:
+            summary, coverage = _map_reduce(text, on_token)
 
     except Exception as e:
-        summary = f"Error generating summary for '{file_name}': {e}"
         print(f"Summarization error for {file_name}: {e}") # Print error to console for debugging
+        return {
+            "file_name": file_name,
+            "summary": f"Error generating summary for '{file_name}': {e}",
+            "error": str(e)
+        }
 
+    if coverage is not None:
+        return {"file_name": file_name, "summary": summary, "coverage": coverage}
     return {"file_name": file_name, "summary": summary}
+
+
+# --- Batched summarization of small documents ---
+
+def is_small_document(text: str) -> bool:
+    """True when a document is small enough to share a request with others."""
+    # Capped at one chunk so batched documents never need the map-reduce path.
+    return bool(text.strip()) and estimate_tokens(text) <= min(SMALL_DOC_TOKENS, CHUNK_TOKENS)
+
+
+def pack_batches(docs: List[Dict]) -> List[List[Dict]]:
+    """Bin-packs documents (first fit, largest first) into batches within the token and size limits."""
+    batches: List[List[Dict]] = []
+    loads: List[int] = []
+    for doc in sorted(docs, key=lambda d: estimate_tokens(d["text"]), reverse=True):
+        tokens = estimate_tokens(doc["text"])
+        for i, batch in enumerate(batches):
+            if loads[i] + tokens <= BATCH_TOKEN_BUDGET and len(batch) < BATCH_MAX_DOCS:
+                batch.append(doc)
+                loads[i] += tokens
+                break
+        else:
+            batches.append([doc])
+            loads.append(tokens)
+    return batches
+
+
+def _parse_batch_response(content: str) -> Dict[str, str]:
+    """Extracts the {id: summary} object from a reply, tolerating code fences and surrounding prose."""
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        parsed = json.loads(content[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {str(k): v.strip() for k, v in parsed.items() if isinstance(v, str) and v.strip()}
+
+
+def _summarize_packed(batch: List[Dict]) -> Dict[str, dict]:
+    if len(batch) == 1:
+        doc = batch[0]
+        return {doc["id"]: summarize_document(doc["file_name"], doc["text"])}
+
+    documents = "\n\n".join(f'<document id="{doc["id"]}">\n{doc["text"]}\n</document>' for doc in batch)
+    try:
+        content = _complete(
+            BATCH_PROMPT_TEMPLATE.format(documents=documents),
+            MAX_TOKENS * len(batch),
+            kind="batch",
+            response_format={"type": "json_object"},
+        )
+        parsed = _parse_batch_response(content)
+    except Exception as e:
+        print(f"Batched summarization failed for {len(batch)} documents, retrying one by one: {e}")
+        parsed = {}
+
+    results = {}
+    for doc in batch:
+        if doc["id"] in parsed:
+            results[doc["id"]] = {"file_name": doc["file_name"], "summary": parsed[doc["id"]]}
+        else:
+            # Missing or unparseable entries fall back to a dedicated request.
+            results[doc["id"]] = summarize_document(doc["file_name"], doc["text"])
+    return results
+
+
+def summarize_batch(docs: List[Dict]) -> Dict[str, dict]:
+    """
+    Summarizes many small documents with as few requests as possible.
+    docs are {"id", "file_name", "text"} dicts; returns {id: summarize_document()-style result}.
+    """
+    results: Dict[str, dict] = {}
+    for batch_results in _get_map_pool().map(_summarize_packed, pack_batches(docs)):
+        results.update(batch_results)
+    return results
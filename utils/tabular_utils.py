@@ -0,0 +1,329 @@
+# tabular_utils.py
+import csv
+import datetime
+import io
+import os
+import random
+import re
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Size of the compact text produced for a spreadsheet or CSV file, across all sheets.
+TABLE_MAX_CHARS = int(os.getenv("TABLE_MAX_CHARS", "8000"))
+# Rows kept per sheet by reservoir sampling, and distinct values tracked per column.
+TABLE_SAMPLE_ROWS = int(os.getenv("TABLE_SAMPLE_ROWS", "20"))
+TABLE_DISTINCT_LIMIT = int(os.getenv("TABLE_DISTINCT_LIMIT", "1000"))
+TABLE_MAX_CELL_CHARS = 60
+# Values a column is given to look numeric or date-like before its text is no longer parsed.
+TYPE_SAMPLE_VALUES = 1000
+CSV_SNIFF_BYTES = 64 * 1024
+
+# Numbers written with commas: thousands separators ("1,234.5") or a decimal comma,
+# optionally with dots between thousands ("1,5" or "1.234,5"). Other text with commas is not a number.
+_THOUSANDS_COMMAS = re.compile(r"^[-+]?\d{1,3}(,\d{3})+(\.\d+)?$")
+_DECIMAL_COMMA = re.compile(r"^[-+]?(\d+|\d{1,3}(\.\d{3})+),\d+$")
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _parse_number(text: str) -> Optional[float]:
+    if "," in text:
+        text = text.strip()
+        if _THOUSANDS_COMMAS.match(text):
+            text = text.replace(",", "")
+        elif _DECIMAL_COMMA.match(text):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _parse_date(text: str):
+    # Only ISO-looking strings are tried, so ordinary text costs a length check and one comparison.
+    text = text.strip()
+    if 10 <= len(text) <= 26 and text[4] == "-":
+        try:
+            return datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    return None
+
+
+def _trim(row: Sequence) -> Sequence:
+    """Drops trailing blank cells, which spreadsheets pad rows with up to the widest row."""
+    end = len(row)
+    while end and _is_blank(row[end - 1]):
+        end -= 1
+    return row[:end]
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        value = value.date()
+    text = " ".join(str(value).split())
+    if len(text) > TABLE_MAX_CELL_CHARS:
+        text = text[: TABLE_MAX_CELL_CHARS - 3] + "..."
+    return text
+
+
+def _format_number(value: float) -> str:
+    if float(value).is_integer():
+        return f"{value:,.0f}"
+    return f"{value:,.2f}" if abs(value) >= 1 else f"{value:.4g}"
+
+
+class ColumnStats:
+    """Running statistics for one column; memory does not grow with the row count."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.non_empty = 0
+        self.numeric = 0
+        self.dates = 0
+        self.total = 0.0
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self.first_date = None
+        self.last_date = None
+        self.distinct = set()
+        self.distinct_overflow = False
+        self.examples: List[str] = []
+        # Text cells are only parsed as numbers or dates while the column still looks typed.
+        self._parse_text = True
+
+    def add(self, value):
+        if value is None or value == "":
+            return
+        raw = None
+        if type(value) is str:
+            if value.isspace():
+                return
+            raw = value
+            if self._parse_text:
+                value = self._parse(value)
+        self.non_empty += 1
+        if not isinstance(value, str):
+            self._add_typed(value)
+
+        if not self.distinct_overflow:
+            text = raw if raw is not None and len(raw) <= TABLE_MAX_CELL_CHARS else _cell_text(value)
+            if text not in self.distinct:
+                if len(self.distinct) >= TABLE_DISTINCT_LIMIT:
+                    self.distinct_overflow = True
+                    self.distinct.clear()
+                else:
+                    self.distinct.add(text)
+                    if len(self.examples) < 3:
+                        self.examples.append(_cell_text(raw if raw is not None else value))
+
+    def _parse(self, text: str):
+        if self.non_empty == TYPE_SAMPLE_VALUES and max(self.numeric, self.dates) < self.non_empty // 2:
+            self._parse_text = False
+            return text
+        number = _parse_number(text)
+        if number is not None:
+            return number
+        return _parse_date(text) or text
+
+    def _add_typed(self, value):
+        if isinstance(value, (datetime.date, datetime.time)):
+            self.dates += 1
+            try:
+                if self.first_date is None or value < self.first_date:
+                    self.first_date = value
+                if self.last_date is None or value > self.last_date:
+                    self.last_date = value
+            except TypeError:
+                # Dates and datetimes do not compare; the range keeps the first kind seen.
+                pass
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.numeric += 1
+            self.total += value
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    def describe(self, rows: int) -> str:
+        if not self.non_empty:
+            return f"- {self.name}: empty"
+        distinct = f">{TABLE_DISTINCT_LIMIT:,}" if self.distinct_overflow else f"{len(self.distinct):,}"
+        parts = [f"{self.non_empty:,}/{rows:,} filled", f"{distinct} distinct"]
+        # A column counts as numeric (or dates) when most of its values are.
+        if self.numeric >= self.non_empty * 0.9:
+            kind = "numeric"
+            parts += [
+                f"min {_format_number(self.minimum)}",
+                f"max {_format_number(self.maximum)}",
+                f"mean {_format_number(self.total / self.numeric)}",
+            ]
+        elif self.dates >= self.non_empty * 0.9:
+            kind = "date"
+            parts += [f"from {_cell_text(self.first_date)}", f"to {_cell_text(self.last_date)}"]
+        else:
+            kind = "text"
+            parts.append("e.g. " + ", ".join(self.examples))
+        return f"- {self.name} ({kind}): " + "; ".join(parts)
+
+
+class SheetSummary:
+    """Streams the rows of one table into a schema, per-column statistics and a row sample."""
+
+    def __init__(self, name: Optional[str], header: Sequence, sample_size: int = TABLE_SAMPLE_ROWS):
+        self.name = name
+        self.columns: List[ColumnStats] = []
+        for position, value in enumerate(_trim(header)):
+            self._add_column(_cell_text(value), position)
+        self.rows = 0
+        self.sample_size = sample_size
+        self.sample: List[Tuple[int, List[str]]] = []
+        # Seeded so the same file always yields the same sample (and cache-friendly text).
+        self._random = random.Random(0)
+
+    def _add_column(self, label: str, position: int):
+        if not label or label in (column.name for column in self.columns):
+            label = f"column_{position + 1}"
+        self.columns.append(ColumnStats(label))
+
+    def add_row(self, row: Sequence):
+        row = _trim(row)
+        if not row:
+            return
+        while len(self.columns) < len(row):
+            self._add_column("", len(self.columns))
+        for column, value in zip(self.columns, row):
+            column.add(value)
+        self.rows += 1
+
+        # Reservoir sampling keeps a uniform sample of sample_size rows in constant memory.
+        if len(self.sample) < self.sample_size:
+            self.sample.append((self.rows, [_cell_text(value) for value in row]))
+        else:
+            slot = self._random.randrange(self.rows)
+            if slot < self.sample_size:
+                self.sample[slot] = (self.rows, [_cell_text(value) for value in row])
+
+    def render_schema(self) -> str:
+        title = f"Sheet: {self.name}" if self.name else "Table"
+        lines = [f"{title} ({self.rows:,} rows, {len(self.columns)} columns)", "Columns:"]
+        lines += [column.describe(self.rows) for column in self.columns]
+        return "\n".join(lines)
+
+    def render_sample(self, budget: int) -> str:
+        """Renders sampled rows in file order, stopping before budget characters."""
+        if not self.sample or budget <= 0:
+            return ""
+        rows = sorted(self.sample)
+        heading = f"Sample rows ({len(rows)} of {self.rows:,}):" if self.rows > len(rows) else "Rows:"
+        lines = [heading, " | ".join(column.name for column in self.columns)]
+        used = sum(len(line) + 1 for line in lines)
+        if used > budget:
+            return ""
+        for _, values in rows:
+            line = " | ".join(values)
+            if used + len(line) + 1 > budget:
+                break
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines)
+
+
+def render_sheets(sheets: List[SheetSummary], max_chars: int = TABLE_MAX_CHARS) -> str:
+    """
+    Joins the sheet summaries within max_chars: every sheet's schema and statistics
+    come first, and the remaining budget is shared out for sampled rows.
+    """
+    if not sheets:
+        return "(No tabular data found)"
+    schemas = [sheet.render_schema() for sheet in sheets]
+    remaining = max_chars - sum(len(schema) + 2 for schema in schemas)
+    share = remaining // len(sheets) if remaining > 0 else 0
+    blocks = []
+    for sheet, schema in zip(sheets, schemas):
+        sample = sheet.render_sample(share)
+        blocks.append(schema + ("\n" + sample if sample else ""))
+    text = "\n\n".join(blocks)
+    return text[:max_chars]
+
+
+def _summarize_rows(name: Optional[str], rows: Iterable[Sequence]) -> Optional[SheetSummary]:
+    """Builds a SheetSummary from an iterator of rows whose first non-blank row is the header."""
+    rows = iter(rows)
+    for header in rows:
+        if not all(_is_blank(value) for value in header):
+            break
+    else:
+        return None
+    sheet = SheetSummary(name, header)
+    for row in rows:
+        sheet.add_row(row)
+    return sheet
+
+
+def _open_text(source: Union[str, bytes]) -> io.TextIOBase:
+    if isinstance(source, str):
+        return open(source, "r", encoding="utf-8-sig", errors="replace", newline="")
+    return io.TextIOWrapper(io.BytesIO(source), encoding="utf-8-sig", errors="replace", newline="")
+
+
+def _csv_rows(stream: io.TextIOBase) -> Iterator[List[str]]:
+    sample = stream.read(CSV_SNIFF_BYTES)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(stream, dialect)
+
+
+def summarize_csv(source: Union[str, bytes], max_chars: int = TABLE_MAX_CHARS) -> str:
+    """Compact text for a CSV file, read one row at a time."""
+    with _open_text(source) as stream:
+        sheet = _summarize_rows(None, _csv_rows(stream))
+    return render_sheets([sheet] if sheet else [], max_chars)
+
+
+def summarize_xlsx(source: Union[str, bytes], max_chars: int = TABLE_MAX_CHARS) -> str:
+    """Compact text for every sheet of an XLSX workbook, streamed with openpyxl's read-only mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(
+        source if isinstance(source, str) else io.BytesIO(source), read_only=True, data_only=True
+    )
+    try:
+        sheets = []
+        for worksheet in workbook.worksheets:
+            sheet = _summarize_rows(worksheet.title, worksheet.iter_rows(values_only=True))
+            if sheet is not None:
+                sheets.append(sheet)
+    finally:
+        workbook.close()
+    return render_sheets(sheets, max_chars)
+
+
+def summarize_xls(source: Union[str, bytes], max_chars: int = TABLE_MAX_CHARS) -> str:
+    """
+    Compact text for every sheet of a legacy XLS workbook. The format has no streaming
+    reader, but it is capped at 65,536 rows per sheet, so loading a sheet at a time is bounded.
+    """
+    import pandas as pd
+
+    with pd.ExcelFile(source if isinstance(source, str) else io.BytesIO(source)) as workbook:
+        sheets = []
+        for sheet_name in workbook.sheet_names:
+            df = workbook.parse(sheet_name, header=None)
+            rows = (list(row) for row in df.itertuples(index=False, name=None))
+            # pandas marks empty cells as NaN; the summary treats them as blanks.
+            rows = ([None if value != value else value for value in row] for row in rows)
+            sheet = _summarize_rows(sheet_name, rows)
+            if sheet is not None:
+                sheets.append(sheet)
+    return render_sheets(sheets, max_chars)